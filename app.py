@@ -1,9 +1,12 @@
 import streamlit as st
 from auth import login_ui, register_ui
 from quote.ui import quote_ui
-from quote.admin_view import quote_admin_view
+from quote.admin_view import quote_admin_view, quote_summary_view
 from admin import admin_panel
 from quote.email_form import email_form_ui
+from quote.rate_card import get_rate_card
+from quote.distance import metrics as distance_metrics
+from quote.logic_hotshot import band_decision_counts
 
 st.set_page_config("Quote Tool", layout="wide")
 
@@ -31,6 +34,23 @@ with st.sidebar:
     st.image("FSI-logo.png", width=200)
     if st.session_state.get("role") == "admin":
         st.success(f"Admin: {st.session_state.get('name', '')}")
+        card = get_rate_card()
+        st.caption(
+            f"Rate card: {card.source} · version {card.version[:12]} · loaded {card.loaded_at:%Y-%m-%d %H:%M:%S}"
+            f" · ZIP index {len(card.zip_index):,} ZIPs / {card.zip_index.nbytes / 1024:.0f} KiB"
+        )
+        dm = distance_metrics()
+        provider = (
+            f"Maps circuit {dm['breaker_state']} ({dm['breaker_failures']:,} failures, {dm['breaker_rejected']:,} fast-failed)"
+            if "breaker_state" in dm else f"provider {dm['provider']}"
+        )
+        st.caption(
+            f"Distance cache: {dm['cache_lru_hits'] + dm['cache_db_hits']:,} hits ({dm['cache_lru_hits']:,} memory / {dm['cache_db_hits']:,} disk)"
+            f" · {dm['cache_misses']:,} misses · hit rate {dm['cache_hit_rate']:.0%}"
+            f" · {provider}"
+            f" · {dm['singleflight_coalesced']:,} duplicate lookups coalesced"
+            f" · {band_decision_counts()['skipped']:,} lookups skipped (band certain from ZIP centroids)"
+        )
         if st.button("Go to Admin Dashboard"):
             st.session_state.page = "admin"; st.rerun()
         if st.button("Log out"):
@@ -65,8 +85,10 @@ elif page == "email_request":
 elif page == "admin":
     require_admin()
     st.title("🛠️ Admin Dashboard")
-    admin_mode = st.radio("Choose admin function", ["Manage Users", "View Quotes"], horizontal=True)
+    admin_mode = st.radio("Choose admin function", ["Manage Users", "View Quotes", "Summary"], horizontal=True)
     if admin_mode == "Manage Users":
         admin_panel()
     elif admin_mode == "View Quotes":
         quote_admin_view()
+    elif admin_mode == "Summary":
+        quote_summary_view()
@@ -1,15 +1,76 @@
 # db.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from datetime import datetime
-from sqlalchemy.sql import func
+"""
+Models and the database engine.
+
+The database URL comes from DATABASE_URL (default sqlite:///app.db), so the same
+code runs against SQLite or a server database (Postgres, MySQL). Pool sizing is
+explicit (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE). On
+SQLite every new connection is switched to WAL journaling with a busy timeout
+and synchronous=NORMAL, so concurrent quote saves wait for the write lock
+instead of failing with "database is locked" and readers never block writers.
+
+Importing this module does not touch the database. Create the schema with
+init_db() once per deployment (python db.py, or python init_db.py which also
+seeds the admin user).
+"""
+import os
 import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, Column, Index, Integer, MetaData, String, Float, Boolean, Date, DateTime, ForeignKey, Table
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy.pool import StaticPool
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///app.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def make_engine(url: str = DATABASE_URL):
+    """Engine for url with explicit pool sizing; SQLite connections get the WAL/busy-timeout pragmas."""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+
+    in_memory = url.database in (None, "", ":memory:")
+    if in_memory:
+        # One shared connection, or every checkout would see its own empty database
+        engine = create_engine(url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+    else:
+        engine = create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        )
 
-DB_PATH = "sqlite:///app.db"
-engine = create_engine(DB_PATH)
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer (persists in the file)
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")  # wait for the write lock instead of failing
+        cursor.execute("PRAGMA synchronous=NORMAL")  # durable enough under WAL, far fewer fsyncs
+        cursor.close()
+
+    return engine
+
+
+engine = make_engine()
 Base = declarative_base()
 Session = sessionmaker(bind=engine)
-session = Session()
 
 class User(Base):
     __tablename__ = 'users'
@@ -29,7 +90,7 @@ class Quote(Base):
     __tablename__ = 'quotes'
     id = Column(Integer, primary_key=True)
     quote_id = Column(String(36), default=lambda: str(uuid.uuid4()), unique=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     user_email = Column(String(100))
     quote_type = Column(String(20))
     origin = Column(String(20))
@@ -47,11 +108,20 @@ class Quote(Base):
     quote_metadata = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="quotes")
-    
+
+    # The admin view pages newest-first on (created_at, id) and filters by type, email and ZIPs
+    __table_args__ = (
+        Index("ix_quotes_created_at_id", "created_at", "id"),
+        Index("ix_quotes_type_created_at", "quote_type", "created_at", "id"),
+        Index("ix_quotes_user_email_created_at", "user_email", "created_at"),
+        Index("ix_quotes_origin", "origin"),
+        Index("ix_quotes_destination", "destination"),
+    )
+
 class EmailQuoteRequest(Base):
     __tablename__ = 'email_quote_requests'
     id = Column(Integer, primary_key=True)
-    quote_id = Column(String(36), ForeignKey('quotes.quote_id'), nullable=False)
+    quote_id = Column(String(36), ForeignKey('quotes.quote_id'), nullable=False, index=True)
     shipper_name = Column(String)
     shipper_address = Column(String)
     shipper_contact = Column(String)
@@ -64,5 +134,43 @@ class EmailQuoteRequest(Base):
     special_instructions = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class QuoteRollup(Base):
+    """Quote volume per UTC day x quote type x origin ZIP3 x destination ZIP3 (see quote/rollups.py)."""
+    __tablename__ = 'quote_daily_rollups'
+    day = Column(Date, primary_key=True)
+    quote_type = Column(String(20), primary_key=True)
+    origin_zip3 = Column(String(3), primary_key=True)  # "" when the origin isn't a ZIP
+    dest_zip3 = Column(String(3), primary_key=True)
+    quote_count = Column(Integer, nullable=False, default=0)
+    total_sum = Column(Float, nullable=False, default=0.0)
+    weight_sum = Column(Float, nullable=False, default=0.0)
+
+
+# Indexes older databases may still have that a newer one makes redundant:
+# ix_quotes_created_at is covered by ix_quotes_created_at_id
+RETIRED_INDEXES = {"quotes": ["ix_quotes_created_at"]}
+
+
+def init_db(bind=None):
+    """
+    Create missing tables, then any missing indexes: create_all only builds indexes
+    together with new tables, so databases created before an index was added get
+    it here. Retired indexes are dropped so inserts stop maintaining them. Safe to
+    run repeatedly.
+    """
+    bind = bind or engine
+    Base.metadata.create_all(bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
+    for table_name, names in RETIRED_INDEXES.items():
+        # Reflected into a throwaway MetaData so the models' own tables are untouched
+        reflected = Table(table_name, MetaData(), autoload_with=bind)
+        for index in reflected.indexes:
+            if index.name in names:
+                index.drop(bind)
+
 
-Base.metadata.create_all(engine)
\ No newline at end of file
+if __name__ == "__main__":
+    init_db()
+    print(f"Schema ready at {engine.url.render_as_string(hide_password=True)}")
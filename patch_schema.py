@@ -1,6 +1,6 @@
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import inspect, text
 
-engine = create_engine("sqlite:///app.db")
+from db import engine
 inspector = inspect(engine)
 
 existing_columns = [col["name"] for col in inspector.get_columns("quotes")]
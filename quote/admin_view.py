@@ -1,30 +1,151 @@
 # File: admin_view.py
+"""
+Admin quote pages: the browser (filters, keyset-paginated table, export) and the
+summary panel. The queries live in quote.quote_history and quote.rollups.
+"""
+import os
+import tempfile
+import time
+from datetime import datetime
+
 import streamlit as st
-import pandas as pd
-from db import Session, Quote
+
+from quote.rollups import daily_summary, top_lanes
+from quote.quote_history import COUNT_CAP, EXPORT_FORMATS, PAGE_SIZE, QUOTE_TYPES, count_quotes, fetch_quotes_page, write_export
 from quote.theme import inject_fsi_theme
 
+# The matching count is reused across page clicks for this long (and redone on returning to page 1)
+COUNT_TTL_SECONDS = 60
+
+
+def _filter_controls() -> dict:
+    with st.expander("Filters", expanded=True):
+        c1, c2, c3 = st.columns(3)
+        dates = c1.date_input("Date range", value=[], format="YYYY-MM-DD")
+        types = c2.multiselect("Type", QUOTE_TYPES)
+        email = c3.text_input("User email starts with").strip()
+        c4, c5, c6, c7 = st.columns(4)
+        origin = c4.text_input("Origin ZIP (or prefix)").strip()
+        destination = c5.text_input("Destination ZIP (or prefix)").strip()
+        min_total = c6.number_input("Min total ($)", min_value=0.0, value=None, step=50.0)
+        max_total = c7.number_input("Max total ($)", min_value=0.0, value=None, step=50.0)
+    return {
+        "start": dates[0] if len(dates) > 0 else None,
+        "end": dates[1] if len(dates) > 1 else None,
+        "types": tuple(types),
+        "email": email,
+        "origin": origin,
+        "destination": destination,
+        "min_total": min_total,
+        "max_total": max_total,
+    }
+
+
+def _count_label(matching: int) -> str:
+    return f"{COUNT_CAP:,}+" if matching > COUNT_CAP else f"{matching:,}"
+
+
+def _export_controls(filters: dict, matching: int):
+    """
+    Build the export in a temp file, chunk by chunk, then offer it for download.
+    Streamlit can't stream a response: the download button holds the finished file in
+    server memory until the next interaction with the page, so the web path needs
+    memory for one whole export. The temp file is deleted as soon as it's handed over.
+    """
+    with st.expander("Export"):
+        fmt = st.radio("Format", list(EXPORT_FORMATS), horizontal=True)
+        st.caption(
+            "The download is held in server memory until you next use this page. "
+            "For very large exports use `python -m quote.quote_history`, which streams to a file."
+        )
+        if not st.button(f"Prepare {fmt} export ({_count_label(matching)} quotes)", disabled=matching == 0):
+            return
+        ext, mime = EXPORT_FORMATS[fmt]
+        fd, path = tempfile.mkstemp(prefix="quotes-", suffix=f".{ext}")
+        os.close(fd)
+        try:
+            with st.spinner("Exporting..."):
+                rows = write_export(filters, fmt, path)
+            name = f"quotes-{datetime.now():%Y%m%d-%H%M}.{ext}"
+            with open(path, "rb") as f:
+                # Read once, here; "ignore" keeps the click from rerunning the page
+                st.download_button(f"Download {name} ({rows:,} rows)", data=f, file_name=name, mime=mime, on_click="ignore")
+        finally:
+            os.unlink(path)
+
+
 def quote_admin_view():
     inject_fsi_theme()
     st.subheader("📦 All Submitted Quotes")
 
-    db = Session()
-    quotes = db.query(Quote).all()
-    db.close()
-
-    df = pd.DataFrame([{
-        "Quote ID": q.quote_id,
-        "User ID": q.user_id,
-        "User Email": q.user_email,
-        "Type": q.quote_type,
-        "Origin": q.origin,
-        "Destination": q.destination,
-        "Weight": q.weight,
-        "Method": q.weight_method,
-        "Zone": q.zone,
-        "Total": q.total,
-        "Accessorials": q.quote_metadata,
-        "Date": q.created_at.strftime("%Y-%m-%d %H:%M")
-    } for q in quotes])
-
-    st.dataframe(df)
\ No newline at end of file
+    filters = _filter_controls()
+    # Changing a filter starts again from the newest page
+    signature = repr(sorted(filters.items()))
+    if st.session_state.get("admin_quote_filters") != signature:
+        st.session_state.admin_quote_filters = signature
+        st.session_state.admin_quote_cursors = [None]
+        st.session_state.pop("admin_quote_count", None)
+    cursors = st.session_state.admin_quote_cursors
+
+    # Counted (and capped) once per filter, not on every page click; refreshed when stale
+    counted = st.session_state.get("admin_quote_count")
+    if counted is None or time.monotonic() - counted[1] > COUNT_TTL_SECONDS:
+        counted = st.session_state.admin_quote_count = (count_quotes(filters), time.monotonic())
+    matching = counted[0]
+
+    df, next_cursor = fetch_quotes_page(filters, cursors[-1])
+    st.caption(f"{_count_label(matching)} matching quotes · page {len(cursors)} · {PAGE_SIZE} per page, newest first")
+    st.dataframe(
+        df,
+        hide_index=True,
+        column_config={
+            "Date": st.column_config.DatetimeColumn("Date", format="YYYY-MM-DD HH:mm"),
+            "Total": st.column_config.NumberColumn("Total", format="$%.2f"),
+        },
+    )
+
+    newer, older = st.columns(2)
+    if newer.button("← Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        if len(cursors) == 1:
+            # Back on the newest page: count again so quotes saved since then show up
+            st.session_state.pop("admin_quote_count", None)
+        st.rerun()
+    if older.button("Older →", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+
+    _export_controls(filters, matching)
+
+
+def quote_summary_view():
+    """Volume and revenue by day, mode and lane, read from the daily rollups only."""
+    inject_fsi_theme()
+    st.subheader("📊 Quote Summary")
+
+    days = st.radio("Period", [7, 30, 90, 365], index=1, horizontal=True, format_func=lambda d: f"Last {d} days")
+    daily = daily_summary(days)
+    if daily.empty:
+        st.info("No quotes in this period. (Run `python -m quote.rollups backfill` once after upgrading.)")
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    quotes, revenue = int(daily["quotes"].sum()), float(daily["revenue"].sum())
+    c1.metric("Quotes", f"{quotes:,}")
+    c2.metric("Quoted revenue", f"${revenue:,.0f}")
+    c3.metric("Average quote", f"${revenue / quotes:,.2f}" if quotes else "—")
+    c4.metric("Weight quoted", f"{daily['weight'].sum():,.0f} lbs")
+
+    st.caption("Quotes per day (UTC)")
+    st.bar_chart(daily.pivot_table(index="day", columns="quote_type", values="quotes", aggfunc="sum", fill_value=0))
+
+    by_mode = daily.groupby("quote_type")[["quotes", "revenue", "weight"]].sum().sort_values("revenue", ascending=False)
+    st.caption("By mode")
+    st.dataframe(by_mode, column_config={"revenue": st.column_config.NumberColumn("revenue", format="$%.2f")})
+
+    st.caption("Top lanes by revenue (origin ZIP3 → destination ZIP3)")
+    st.dataframe(
+        top_lanes(days),
+        hide_index=True,
+        column_config={"revenue": st.column_config.NumberColumn("revenue", format="$%.2f")},
+    )
@@ -0,0 +1,150 @@
+# File: batch.py
+"""
+Bulk quote runner: price a CSV of lanes into a CSV of quotes.
+
+    python -m quote.batch lanes.csv priced.csv [--mode air|hotshot] [--chunksize 50000] [--workers 4] [--offline]
+
+Input columns: origin, destination, weight, optional accessorial_total, and
+quote_type (Air/Hotshot) per row unless --mode is given. Output is the input
+columns plus the quote breakdown and an error column, in input order.
+
+The file is streamed in chunks so memory stays flat for very large inputs.
+Chunks fan out to a process pool; every worker memory-maps the same compiled
+rate-card snapshot (built once up front), and results are written back in
+submission order while at most a few chunks are in flight.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+try:
+    from quote.rate_card import WORKBOOK_PATH, compile_workbook, get_rate_card
+    from quote.logic_air import calculate_air_quotes_batch
+    from quote.logic_hotshot import calculate_hotshot_quotes_batch
+    from quote.distance import get_distances
+except ImportError:
+    from rate_card import WORKBOOK_PATH, compile_workbook, get_rate_card
+    from logic_air import calculate_air_quotes_batch
+    from logic_hotshot import calculate_hotshot_quotes_batch
+    from distance import get_distances
+
+RESULT_COLUMNS = [
+    "quote_type", "zone", "miles", "quote_total", "min_charge", "per_lb", "weight_break",
+    "origin_beyond", "dest_beyond", "origin_charge", "dest_charge", "beyond_total", "error",
+]
+
+_workbook_path = WORKBOOK_PATH
+
+
+def _init_worker(workbook_path: str):
+    global _workbook_path
+    _workbook_path = workbook_path
+    get_rate_card(workbook_path)  # load once per worker, from the snapshot
+
+
+def price_chunk(chunk: pd.DataFrame, mode: str | None = None, offline: bool = False) -> pd.DataFrame:
+    """
+    Price one chunk of lanes; returns the chunk with RESULT_COLUMNS appended.
+    offline=True prices Hotshot lanes from the distance cache and ZIP3 matrix only, never calling Google.
+    """
+    card = get_rate_card(_workbook_path)
+    if mode:
+        kinds = pd.Series(mode.capitalize(), index=chunk.index)
+    elif "quote_type" in chunk.columns:
+        kinds = chunk["quote_type"].astype(str).str.strip().str.capitalize()
+    else:
+        raise ValueError("Input has no quote_type column; pass --mode air or --mode hotshot.")
+
+    parts = []
+    air = kinds == "Air"
+    hotshot = kinds == "Hotshot"
+    if air.any():
+        parts.append(calculate_air_quotes_batch(chunk[air], card).assign(quote_type="Air"))
+    if hotshot.any():
+        resolve = partial(get_distances, offline=True) if offline else None
+        parts.append(calculate_hotshot_quotes_batch(chunk[hotshot], card.hotshot_rates, resolve).assign(quote_type="Hotshot"))
+    other = ~(air | hotshot)
+    if other.any():
+        parts.append(pd.DataFrame({
+            "quote_type": kinds[other],
+            "error": "Unknown quote_type " + kinds[other].map(repr),
+        }, index=chunk.index[other]))
+
+    out = chunk.drop(columns=[c for c in RESULT_COLUMNS if c in chunk.columns])
+    for col in RESULT_COLUMNS:
+        pieces = [p[col] for p in parts if col in p.columns]
+        out[col] = (pd.concat(pieces) if len(pieces) > 1 else pieces[0]).reindex(chunk.index) if pieces else None
+    return out
+
+
+def _price_chunk_csv(chunk: pd.DataFrame, mode: str | None, offline: bool = False) -> tuple[list, str]:
+    # Format in the worker so the parent only concatenates text
+    priced = price_chunk(chunk, mode, offline)
+    return list(priced.columns), priced.to_csv(index=False, header=False)
+
+
+def run(input_path, output_path, mode=None, chunksize=50_000, workers=None, workbook_path=WORKBOOK_PATH, offline=False) -> int:
+    """Stream input_path -> output_path; returns the number of rows priced."""
+    compile_workbook(workbook_path)  # build the snapshot once, before any worker needs it
+    reader = pd.read_csv(
+        input_path,
+        chunksize=chunksize,
+        dtype={"origin": str, "destination": str},  # keep leading zeros
+        skipinitialspace=True,
+    )
+    rows = 0
+    with open(output_path, "w", newline="") as out:
+
+        def write(columns, text, n):
+            nonlocal rows
+            if rows == 0 and not out.tell():
+                out.write(pd.DataFrame(columns=columns).to_csv(index=False))
+            out.write(text)
+            rows += n
+
+        if workers == 0:
+            _init_worker(workbook_path)
+            for chunk in reader:
+                write(*_price_chunk_csv(chunk, mode, offline), len(chunk))
+            return rows
+
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(workbook_path,)) as pool:
+            pending = deque()
+            for chunk in reader:
+                pending.append((pool.submit(_price_chunk_csv, chunk, mode, offline), len(chunk)))
+                if len(pending) >= workers * 2:  # bounded window keeps memory flat
+                    future, n = pending.popleft()
+                    write(*future.result(), n)
+            while pending:
+                future, n = pending.popleft()
+                write(*future.result(), n)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quote.batch", description="Price a CSV of lanes.")
+    parser.add_argument("input", help="CSV with origin, destination, weight[, accessorial_total][, quote_type]")
+    parser.add_argument("output", help="CSV to write priced quotes to")
+    parser.add_argument("--mode", choices=["air", "hotshot"], help="price every row as this quote type")
+    parser.add_argument("--chunksize", type=int, default=50_000, help="rows per chunk (default 50000)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count; 0 = in-process)")
+    parser.add_argument("--workbook", default=WORKBOOK_PATH, help=f"rate workbook (default {WORKBOOK_PATH!r})")
+    parser.add_argument("--offline", action="store_true", help="Hotshot miles from the distance cache + ZIP3 matrix only (no Google calls)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = run(args.input, args.output, args.mode, args.chunksize, args.workers, args.workbook, args.offline)
+    elapsed = time.perf_counter() - start
+    print(f"[batch] {rows:,} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s) -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
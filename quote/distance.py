@@ -1,5 +1,66 @@
 # quote/distance.py
-import os, requests
+"""
+Driving miles between ZIP codes.
+
+Every lookup goes cache -> Google Maps -> ZIP3 matrix. Calls to Google run inside a latency
+budget (DISTANCE_DEADLINE_SECONDS) with a few jittered retries for transient
+errors, behind a circuit breaker that fails fast once the API keeps failing;
+when Google can't answer, the offline ZIP3 matrix (quote.zip3_matrix) supplies
+typical miles for the two ZIP3 areas, marked source="zip3".
+Concurrent lookups of the same lane share one call (single-flight), and the
+quote page prefetches a lane as soon as both ZIPs are entered.
+The source of miles is a DistanceProvider chosen by DISTANCE_PROVIDER:
+Google (default), the local road graph (quote.road_graph) or a replayed
+fixture (quote.distance_replay) for offline load tests; quote.distance_stub
+serves a fake Maps API for exercising the Google client itself.
+lookup_distance() reports what happened as a DistanceResult instead of a bare
+None, so callers can tell "no route" from "Google is down" and never price a
+lane at 0 miles by accident.
+"""
+import os, random, threading, time, requests
+import numpy as np
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+try:
+    from quote.distance_cache import DIRECTIONS, MATRIX, get_distance_cache
+    from quote.utils import ReadOnly
+    from quote.zip3_matrix import get_zip3_matrix
+except ImportError:
+    from distance_cache import DIRECTIONS, MATRIX, get_distance_cache
+    from utils import ReadOnly
+    from zip3_matrix import get_zip3_matrix
+
+# Point this at a local stand-in server for tests/benchmarks
+BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com/maps/api")
+# "google" (default), "roadgraph" or "replay"
+PROVIDER = os.getenv("DISTANCE_PROVIDER", "google").strip().lower()
+# Replay fixture for PROVIDER=replay; DISTANCE_RECORD=path appends every provider lookup to a fixture
+FIXTURE_PATH = os.getenv("DISTANCE_FIXTURE", "distance_fixture.jsonl")
+RECORD_PATH = os.getenv("DISTANCE_RECORD", "")
+METERS_PER_MILE = 1609.344
+
+# Latency budget per lookup (all attempts and backoff included) and retry policy
+DEADLINE_SECONDS = float(os.getenv("DISTANCE_DEADLINE_SECONDS", "4"))
+MAX_ATTEMPTS = int(os.getenv("DISTANCE_MAX_ATTEMPTS", "3"))
+BACKOFF_SECONDS = 0.2
+# Circuit breaker: open after this many consecutive failures, probe again after the cooldown
+BREAKER_THRESHOLD = int(os.getenv("DISTANCE_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("DISTANCE_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Background threads for speculative lookups started while the quote form is being filled in
+PREFETCH_WORKERS = int(os.getenv("DISTANCE_PREFETCH_WORKERS", "4"))
+
+# Distance Matrix request limits
+MAX_ORIGINS = 25
+MAX_DESTINATIONS = 25
+MAX_ELEMENTS = 100
+
+# Google statuses worth another attempt; everything else is final
+_RETRYABLE_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+# Statuses that are a real answer about the route, not a sick API
+_NO_ROUTE_STATUSES = {"NOT_FOUND", "ZERO_RESULTS"}
 
 def _get_secret(name: str):
     try:
@@ -19,34 +80,520 @@ def _sanitize_zip(z: str) -> str | None:
         return s + ",USA"     # helps disambiguate
     return None
 
-def get_distance_miles(origin_zip, destination_zip):
-    api_key = _get_secret("GOOGLE_MAPS_API_KEY") or os.getenv("GOOGLE_MAPS_API_KEY")
-    if not api_key:
-        # Optional: print for Streamlit logs
-        print("[distance] No GOOGLE_MAPS_API_KEY found")
-        return None
+def _api_key():
+    return _get_secret("GOOGLE_MAPS_API_KEY") or os.getenv("GOOGLE_MAPS_API_KEY")
+
+
+class DistanceResult(ReadOnly):
+    """
+    Outcome of one lookup. status is "ok" when miles is set; otherwise one of
+    "bad_zip", "no_api_key", "no_route", "timeout", "circuit_open", "error".
+    source says where the miles came from: "cache" or "google" (exact), "roadgraph" or
+    "replay" (the other providers), or "zip3" (typical miles between the two 3-digit
+    ZIP areas, used when the provider is unavailable).
+    """
+
+    __slots__ = ("miles", "status", "detail", "source")
+
+    def __init__(self, miles: float | None, status: str, detail: str = "", source: str = ""):
+        self._init(miles=miles, status=status, detail=detail, source=source)
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    def __repr__(self):
+        return f"DistanceResult(miles={self.miles!r}, status={self.status!r}, detail={self.detail!r}, source={self.source!r})"
+
+
+class DistanceUnavailableError(RuntimeError):
+    """Raised by pricing code that needs miles it couldn't get; str() is fit to show the user."""
+
+    _MESSAGES = {
+        "bad_zip": "Please enter valid 5-digit origin and destination ZIP codes.",
+        "no_api_key": "Distance lookups are not configured (no GOOGLE_MAPS_API_KEY).",
+        "no_route": "No driving route was found between these ZIP codes.",
+        "timeout": "The mapping service did not answer in time. Please try again shortly.",
+        "circuit_open": "The mapping service is currently unavailable. Please try again in a minute.",
+        "error": "The mapping service returned an error. Please try again shortly.",
+    }
+
+    def __init__(self, origin, destination, result: DistanceResult):
+        self.result = result
+        reason = self._MESSAGES.get(result.status, self._MESSAGES["error"])
+        super().__init__(f"Could not get the driving distance for {origin} -> {destination}. {reason}")
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker. closed: calls go through. open: calls are rejected
+    without touching the network until the cooldown passes. half_open: one probe
+    call is let through; its success closes the breaker, its failure re-opens it.
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SECONDS, name: str = "maps"):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._counts = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+        self._last_error = ""
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = "half_open"
+                self._probing = False
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self._counts["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._counts["successes"] += 1
+            if self._state != "closed":
+                print(f"[distance] circuit {self.name} closed")
+            self._state, self._failures, self._probing = "closed", 0, False
+
+    def record_failure(self, error: str):
+        with self._lock:
+            self._counts["failures"] += 1
+            self._failures += 1
+            self._last_error = error
+            if self._state == "half_open" or (self._state == "closed" and self._failures >= self.threshold):
+                self._state, self._opened_at, self._probing = "open", time.monotonic(), False
+                self._counts["opened"] += 1
+                print(f"[distance] circuit {self.name} open after {self._failures} failure(s): {error}")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._state,
+                "state_code": self.STATES[self._state],
+                "consecutive_failures": self._failures,
+                "last_error": self._last_error,
+                **self._counts,
+            }
+
+
+class SingleFlight:
+    """
+    Process-wide request coalescing: while a call for a key is in flight, other
+    threads asking for the same key wait for it and share its result instead of
+    making their own. `coalesced` counts the calls this saved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: dict = {}  # key -> [done Event, result, exception, waiter count]
+        self._counts = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._inflight.get(key)
+            if call is None:
+                call = self._inflight[key] = [threading.Event(), None, None, 0]
+                self._counts["calls"] += 1
+                leader = True
+            else:
+                call[3] += 1
+                self._counts["coalesced"] += 1
+                leader = False
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = fn()
+        except BaseException as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call[0].set()
+        return call[1]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                **self._counts,
+                "in_flight": len(self._inflight),
+                "waiting": sum(c[3] for c in self._inflight.values()),
+            }
+
+
+_flights = SingleFlight()
+
+
+def plan_matrix_requests(pairs, max_origins=MAX_ORIGINS, max_destinations=MAX_DESTINATIONS, max_elements=MAX_ELEMENTS):
+    """
+    Pack (origin, destination) pairs into Distance Matrix requests: a list of
+    (origins, destinations) whose cross product covers every pair and stays within
+    the per-request limits. Each origin's destinations are split into chunks and
+    placed first-fit into a recent request they fit in, so hub-and-spoke traffic
+    (one origin, many destinations or the reverse) needs few requests.
+    """
+    by_origin: dict[str, list] = {}
+    for o, d in pairs:
+        dests = by_origin.setdefault(o, [])
+        if d not in dests:
+            dests.append(d)
+
+    width = max(1, min(max_destinations, max_elements))
+    batches: list[tuple[list, list]] = []
+    for o, dests in by_origin.items():
+        for i in range(0, len(dests), width):
+            chunk = dests[i:i + width]
+            for origins, batch_dests in reversed(batches[-16:]):  # recent requests only, keeps big plans linear
+                union = batch_dests + [d for d in chunk if d not in batch_dests]
+                n_origins = len(origins) + (o not in origins)
+                if n_origins <= max_origins and len(union) <= max_destinations and n_origins * len(union) <= max_elements:
+                    if o not in origins:
+                        origins.append(o)
+                    batch_dests[:] = union
+                    break
+            else:
+                batches.append(([o], list(chunk)))
+    return batches
+
+
+class DistanceProvider(ABC):
+    """
+    Where driving miles come from. Implementations answer directions() for one lane
+    of sanitized ZIPs and may override miles_many() for bulk lookups.
+    name is reported in metrics; cacheable says whether lookup_distance/get_distances
+    use the distance cache at all (reserved for real Google miles). Providers that
+    aren't cacheable neither read nor fill it, so their answers never depend on
+    whatever a local distance_cache.db happens to hold.
+    """
+
+    name = ""
+    cacheable = True
+
+    @abstractmethod
+    def directions(self, o: str, d: str) -> DistanceResult:
+        """One lookup for a lane of sanitized ZIPs."""
 
+    def directions_miles(self, o: str, d: str):
+        """Miles for sanitized ZIPs; None if the lookup failed."""
+        return self.directions(o, d).miles
+
+    def miles_many(self, pairs) -> dict:
+        """
+        {(origin, destination): miles or None} covering at least the given sanitized
+        pairs; may include extra lanes the provider learned along the way.
+        """
+        return {(o, d): self.directions(o, d).miles for o, d in dict.fromkeys(pairs)}
+
+
+class DistanceClient(DistanceProvider):
+    """
+    Google Maps distance lookups over one pooled keep-alive Session, so repeat
+    calls reuse the TLS connection. Each call gets `deadline` seconds in total for
+    its attempts; failures feed a shared CircuitBreaker. Safe to share across
+    session threads.
+    """
+
+    name = "google"
+
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        api_key: str | None = None,
+        deadline: float = DEADLINE_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS,
+        breaker: CircuitBreaker | None = None,
+        pool_size: int = 10,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._api_key = api_key
+        self.deadline = deadline
+        self.max_attempts = max(1, max_attempts)
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def api_key(self):
+        return self._api_key or _api_key()
+
+    def _call(self, endpoint: str, **params) -> tuple[dict | None, str, str]:
+        """
+        GET {base}/{endpoint}/json within the deadline. Returns (data, status, detail):
+        data is the parsed body when Google answered "OK", status/detail follow DistanceResult.
+        """
+        if not self.api_key:
+            # Optional: print for Streamlit logs
+            print("[distance] No GOOGLE_MAPS_API_KEY found")
+            return None, "no_api_key", "GOOGLE_MAPS_API_KEY is not set"
+        params["key"] = self.api_key
+        url = f"{self.base_url}/{endpoint}/json"
+        give_up_at = time.monotonic() + self.deadline
+        status, detail = "timeout", f"no answer within {self.deadline:g}s"
+
+        for attempt in range(self.max_attempts):
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self.breaker.allow():
+                return None, "circuit_open", "circuit breaker is open"
+            retryable = True
+            try:
+                r = self.session.get(url, params=params, timeout=remaining)
+                if r.status_code == 429 or r.status_code >= 500:
+                    status, detail = "error", f"HTTP {r.status_code}"
+                else:
+                    data = r.json()
+                    api_status = data.get("status")
+                    if api_status == "OK":
+                        self.breaker.record_success()
+                        return data, "ok", ""
+                    detail = f"status={api_status} error={data.get('error_message')}"
+                    if api_status in _NO_ROUTE_STATUSES:
+                        self.breaker.record_success()  # the API is healthy, the lane just has no route
+                        return None, "no_route", detail
+                    status, retryable = "error", api_status in _RETRYABLE_STATUSES
+            except requests.Timeout as e:
+                status, detail = "timeout", str(e)
+            except Exception as e:
+                status, detail = "error", str(e)
+
+            # Surface the reason to Streamlit logs
+            print(f"[distance] {endpoint} attempt {attempt + 1} failed: {detail}")
+            self.breaker.record_failure(detail)
+            if not retryable:
+                break
+            # Full-jitter backoff, but only if there's budget left for another attempt
+            pause = random.uniform(0, BACKOFF_SECONDS * 2 ** attempt)
+            if give_up_at - time.monotonic() - pause < 0.1:
+                break
+            time.sleep(pause)
+        return None, status, detail
+
+    def directions(self, o: str, d: str) -> DistanceResult:
+        """One Directions lookup for sanitized ZIPs."""
+        data, status, detail = self._call("directions", origin=o, destination=d, mode="driving")
+        if data is None:
+            return DistanceResult(None, status, detail, "google")
+        try:
+            meters = data["routes"][0]["legs"][0]["distance"]["value"]
+        except (KeyError, IndexError, TypeError) as e:
+            return DistanceResult(None, "error", f"unexpected response: {e!r}", "google")
+        return DistanceResult(meters / METERS_PER_MILE, "ok", "", "google")
+
+    def matrix_miles(self, origins: list, destinations: list) -> dict:
+        """
+        One Distance Matrix call: {(origin, destination): miles} for every element
+        that resolved. Elements without a route are left out.
+        """
+        data, status, detail = self._call("distancematrix", origins="|".join(origins), destinations="|".join(destinations), mode="driving")
+        if data is None:
+            if status != "circuit_open":
+                print(f"[distance] matrix {status}: {detail}")
+            return {}
+        out = {}
+        for o, row in zip(origins, data.get("rows", [])):
+            for d, element in zip(destinations, row.get("elements", [])):
+                if element.get("status") == "OK":
+                    out[(o, d)] = element["distance"]["value"] / METERS_PER_MILE
+        return out
+
+    def miles_many(self, pairs) -> dict:
+        """Lanes packed into as few Distance Matrix requests as the limits allow, plus every cross-product element returned."""
+        out = {}
+        for origins, destinations in plan_matrix_requests(pairs):
+            out.update(self.matrix_miles(origins, destinations))
+        return out
+
+
+_client: DistanceProvider | None = None
+_client_lock = threading.Lock()
+
+def _make_provider(name: str) -> DistanceProvider:
+    if name == "google":
+        return DistanceClient()
+    if name == "roadgraph":
+        try:
+            from quote.road_graph import RoadGraphProvider
+        except ImportError:
+            from road_graph import RoadGraphProvider
+        return RoadGraphProvider()
+    if name == "replay":
+        try:
+            from quote.distance_replay import ReplayProvider
+        except ImportError:
+            from distance_replay import ReplayProvider
+        return ReplayProvider(FIXTURE_PATH)
+    raise ValueError(f"Unknown DISTANCE_PROVIDER {name!r} (expected 'google', 'roadgraph' or 'replay')")
+
+def get_client() -> DistanceProvider:
+    """
+    The process-wide distance provider, chosen by DISTANCE_PROVIDER (for Google: one
+    connection pool and breaker for every session thread). With DISTANCE_RECORD set,
+    its lookups are also written to that fixture file.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                provider = _make_provider(PROVIDER)
+                if RECORD_PATH:
+                    try:
+                        from quote.distance_replay import RecordingProvider
+                    except ImportError:
+                        from distance_replay import RecordingProvider
+                    provider = RecordingProvider(provider, RECORD_PATH)
+                _client = provider
+    return _client
+
+def set_provider(provider: DistanceProvider | None) -> DistanceProvider | None:
+    """Install a provider for this process (tests, benchmarks); None reverts to DISTANCE_PROVIDER. Returns the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, provider
+    return previous
+
+
+def lookup_distance(origin_zip, destination_zip) -> DistanceResult:
+    """Driving miles for a ZIP pair with an explicit status; never raises for API trouble."""
     o = _sanitize_zip(origin_zip)
     d = _sanitize_zip(destination_zip)
     if not o or not d:
         print(f"[distance] Bad zips -> origin={origin_zip!r}, dest={destination_zip!r}")
-        return None
+        return DistanceResult(None, "bad_zip", f"origin={origin_zip!r}, destination={destination_zip!r}")
 
-    url = (
-        "https://maps.googleapis.com/maps/api/directions/json"
-        f"?origin={o}&destination={d}&mode=driving&key={api_key}"
-    )
-    try:
-        r = requests.get(url, timeout=20)
-        data = r.json()
-        if data.get("status") == "OK":
-            meters = data["routes"][0]["legs"][0]["distance"]["value"]
-            miles = meters / 1609.344
-            return miles
-        else:
-            # Surface the reason to Streamlit logs
-            print(f"[distance] status={data.get('status')} error={data.get('error_message')}")
-            return None
-    except Exception as e:
-        print(f"[distance] exception={e}")
+    # Repeat lanes are answered from the LRU / SQLite cache without a network call.
+    # Only Directions miles count: batch Distance Matrix entries never price a single quote.
+    client = get_client()
+    cache = get_distance_cache() if client.cacheable else None
+    miles = cache.get(o, d, sources=(DIRECTIONS,)) if cache is not None else None
+    if miles is not None:
+        return DistanceResult(miles, "ok", "", "cache")
+
+    def fetch():
+        result = client.directions(o, d)
+        if result.ok and cache is not None:
+            cache.put(o, d, result.miles, DIRECTIONS)
+        return result
+
+    # Sessions asking for the same lane at the same moment share one API call
+    result = _flights.do((o, d), fetch)
+    if result.ok or result.status == "no_route":
+        return result
+
+    # Google is unavailable: fall back to the offline ZIP3 tier if it knows this area pair
+    matrix = get_zip3_matrix()
+    miles = matrix.lookup(o, d) if matrix is not None else None
+    if miles is None:
+        return result
+    return DistanceResult(miles, "ok", f"{result.status}: {result.detail}", "zip3")
+
+
+_prefetch_pool: ThreadPoolExecutor | None = None
+_prefetch_counts = {"started": 0, "cancelled": 0}
+
+def prefetch_distance(origin_zip, destination_zip) -> Future | None:
+    """
+    Start lookup_distance for a lane in the background so the miles are usually
+    cached (or in flight, which lookup_distance joins) by the time the quote is
+    generated. Returns the Future, or None unless both ZIPs are 5-digit values.
+    """
+    global _prefetch_pool
+    if not _sanitize_zip(origin_zip) or not _sanitize_zip(destination_zip):
         return None
+    with _client_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="distance-prefetch")
+        _prefetch_counts["started"] += 1
+    return _prefetch_pool.submit(lookup_distance, origin_zip, destination_zip)
+
+def cancel_prefetch(future: Future | None):
+    """Drop a prefetch whose lane is stale. One that already started still finishes and fills the cache."""
+    if future is not None and future.cancel():
+        with _client_lock:
+            _prefetch_counts["cancelled"] += 1
+
+
+def get_distance_miles(origin_zip, destination_zip):
+    """Miles for a ZIP pair, or None if unavailable (see lookup_distance for why)."""
+    return lookup_distance(origin_zip, destination_zip).miles
+
+
+def get_distances(pairs, offline: bool = False) -> dict:
+    """
+    {(origin, destination): miles or None} for many lanes at once, keyed by the pairs
+    as given. Cached lanes (Directions or Matrix miles) cost nothing; the rest go to
+    the provider's miles_many() (for Google, as few Distance Matrix requests as the
+    API limits allow). Every cacheable element returned is cached as Matrix miles,
+    including cross-product lanes nobody asked for yet; lookup_distance ignores those.
+
+    offline=True never calls Google: lanes missing from the cache get the ZIP3
+    matrix's typical miles instead (None if it has none), for fast bulk re-pricing.
+    A provider that isn't cacheable skips the cache entirely.
+    """
+    client = get_client()
+    cache = get_distance_cache() if client.cacheable else None
+    out, wanted = {}, {}
+    for pair in pairs:
+        o, d = _sanitize_zip(pair[0]), _sanitize_zip(pair[1])
+        if not o or not d:
+            out[pair] = None
+            continue
+        miles = cache.get(o, d) if cache is not None else None
+        out[pair] = miles
+        if miles is None:
+            wanted.setdefault((o, d), []).append(pair)
+
+    if wanted and offline:
+        matrix = get_zip3_matrix()
+        if matrix is not None:
+            keys = list(wanted)
+            miles = matrix.lookup_many([o for o, _ in keys], [d for _, d in keys])
+            for key, m in zip(keys, miles):
+                for pair in wanted[key]:
+                    out[pair] = None if np.isnan(m) else float(m)
+    elif wanted:
+        for (o, d), miles in client.miles_many(list(wanted)).items():
+            if miles is None:
+                continue
+            if cache is not None:
+                cache.put(o, d, miles, MATRIX)
+            for pair in wanted.get((o, d), ()):
+                out[pair] = miles
+    return out
+
+
+def metrics() -> dict:
+    """Breaker state, cache and coalescing counters for dashboards/logs, prefixed by component."""
+    client = get_client()
+    out = {"provider": client.name}
+    breaker = getattr(client, "breaker", None)
+    if breaker is not None:
+        out.update({f"breaker_{k}": v for k, v in breaker.metrics().items()})
+    out.update({f"cache_{k}": v for k, v in get_distance_cache().stats().items()})
+    out.update({f"singleflight_{k}": v for k, v in _flights.metrics().items()})
+    out.update({f"prefetch_{k}": v for k, v in _prefetch_counts.items()})
+    matrix = get_zip3_matrix()
+    out["zip3_pairs"] = matrix.coverage if matrix is not None else 0
+    return out
@@ -0,0 +1,196 @@
+# File: distance_cache.py
+"""
+Persistent ZIP-pair mileage cache.
+
+Driving miles between two 5-digit ZIPs rarely change, and most Hotshot quotes
+repeat a lane that was priced before. Distances are kept in a small SQLite
+sidecar file (DISTANCE_CACHE_PATH, default "distance_cache.db") with a TTL
+(DISTANCE_CACHE_TTL_DAYS, default 90), and an in-process LRU
+(DISTANCE_CACHE_LRU_SIZE entries) sits in front of it so a repeat lane in the
+same process doesn't even touch the file.
+
+Keys are directional (origin, destination) ZIP5 strings: the quote has always
+been priced on the route as entered, and A->B and B->A can differ. Only
+successful lookups are stored; failures are never cached.
+
+Each entry records the Google endpoint it came from ("directions" or "matrix").
+The interactive quote page reads only Directions miles, so warming the cache
+with a Distance Matrix batch never changes an interactive price; batch pricing
+reads either. A Matrix entry never replaces a fresh Directions one. Rows written
+before sources were recorded have source "" and are only used by batch pricing.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from quote.zip_index import zip_key
+except ImportError:
+    from zip_index import zip_key
+
+CACHE_PATH = os.getenv("DISTANCE_CACHE_PATH", "distance_cache.db")
+TTL_SECONDS = float(os.getenv("DISTANCE_CACHE_TTL_DAYS", "90")) * 86400
+LRU_SIZE = int(os.getenv("DISTANCE_CACHE_LRU_SIZE", "50000"))
+
+DIRECTIONS = "directions"
+MATRIX = "matrix"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS distances (
+    origin      TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    miles       REAL NOT NULL,
+    fetched_at  REAL NOT NULL,
+    source      TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (origin, destination)
+) WITHOUT ROWID
+"""
+
+
+def lane_key(origin, destination) -> tuple[str, str] | None:
+    """("02134", "60601") for any ZIP spelling zip_key understands; None if either side isn't a ZIP."""
+    o, d = zip_key(origin), zip_key(destination)
+    if o is None or d is None:
+        return None
+    return f"{o:05d}", f"{d:05d}"
+
+
+class DistanceCache:
+    """Thread-safe LRU + SQLite cache of lane -> miles, with hit/miss counters."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl_seconds: float = TTL_SECONDS, lru_size: int = LRU_SIZE):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.lru_size = lru_size
+        self._lru: OrderedDict[tuple[str, str], tuple[float, float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._counts = {"lru_hits": 0, "db_hits": 0, "misses": 0, "expired": 0, "stores": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")  # batch workers share the file
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            if "source" not in {row[1] for row in conn.execute("PRAGMA table_info(distances)")}:
+                conn.execute("ALTER TABLE distances ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+            self._conn = conn
+        return self._conn
+
+    def _fresh(self, fetched_at: float, now: float) -> bool:
+        return self.ttl_seconds <= 0 or now - fetched_at < self.ttl_seconds
+
+    def _remember(self, key, miles: float, fetched_at: float, source: str):
+        self._lru[key] = (miles, fetched_at, source)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, origin, destination, sources=None) -> float | None:
+        """
+        Cached miles for the lane, or None on a miss (unknown, expired, not a ZIP pair,
+        or cached from a source outside `sources` when that is given).
+        """
+        key = lane_key(origin, destination)
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None and self._fresh(hit[1], now) and (sources is None or hit[2] in sources):
+                self._lru.move_to_end(key)
+                self._counts["lru_hits"] += 1
+                return hit[0]
+            # Not in the LRU, or held there from another source: the file may have newer miles
+            try:
+                row = self._db().execute(
+                    "SELECT miles, fetched_at, source FROM distances WHERE origin = ? AND destination = ?", key
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"[distance cache] read failed: {e}")
+                row = None
+            if row is not None and self._fresh(row[1], now):
+                self._remember(key, row[0], row[1], row[2])
+                if sources is None or row[2] in sources:
+                    self._counts["db_hits"] += 1
+                    return row[0]
+            elif row is not None:
+                self._counts["expired"] += 1
+                self._lru.pop(key, None)
+            else:
+                self._lru.pop(key, None)
+            self._counts["misses"] += 1
+            return None
+
+    def get_many(self, lanes, sources=None) -> dict:
+        """{(origin, destination): miles} for the lanes that are cached; misses are left out."""
+        out = {}
+        for o, d in lanes:
+            miles = self.get(o, d, sources)
+            if miles is not None:
+                out[(o, d)] = miles
+        return out
+
+    def put(self, origin, destination, miles: float, source: str = DIRECTIONS):
+        """Store miles from `source` (DIRECTIONS or MATRIX); MATRIX never replaces a fresh DIRECTIONS entry."""
+        key = lane_key(origin, destination)
+        if key is None or miles is None:
+            return
+        now = time.time()
+        stale_before = now - self.ttl_seconds if self.ttl_seconds > 0 else float("-inf")
+        with self._lock:
+            held = self._lru.get(key)
+            if source == DIRECTIONS or held is None or held[2] != DIRECTIONS or held[1] < stale_before:
+                self._remember(key, float(miles), now, source)
+            try:
+                self._db().execute(
+                    "INSERT INTO distances (origin, destination, miles, fetched_at, source) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (origin, destination) DO UPDATE SET "
+                    "miles = excluded.miles, fetched_at = excluded.fetched_at, source = excluded.source "
+                    "WHERE excluded.source = ? OR distances.source != ? OR distances.fetched_at < ?",
+                    (*key, float(miles), now, source, DIRECTIONS, DIRECTIONS, stale_before),
+                )
+            except sqlite3.Error as e:
+                # A read-only or locked file only costs us persistence; the LRU still has it
+                print(f"[distance cache] write failed: {e}")
+            self._counts["stores"] += 1
+
+    def purge_expired(self) -> int:
+        """Delete rows older than the TTL; returns how many were removed."""
+        if self.ttl_seconds <= 0:
+            return 0
+        with self._lock:
+            cur = self._db().execute("DELETE FROM distances WHERE fetched_at < ?", (time.time() - self.ttl_seconds,))
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            counts["lru_size"] = len(self._lru)
+        lookups = counts["lru_hits"] + counts["db_hits"] + counts["misses"]
+        counts["hit_rate"] = (counts["lru_hits"] + counts["db_hits"]) / lookups if lookups else 0.0
+        return counts
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache: DistanceCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_distance_cache() -> DistanceCache:
+    """The process-wide cache, shared by every Streamlit session thread."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DistanceCache()
+    return _cache
@@ -0,0 +1,126 @@
+# File: distance_replay.py
+"""
+Record/replay distance providers.
+
+A fixture is a JSON-lines file with one lookup per line:
+
+    {"origin": "75001", "destination": "76001", "miles": 39.4, "status": "ok", "detail": ""}
+
+RecordingProvider wraps a real provider and appends every lookup it makes
+(DISTANCE_RECORD=path). ReplayProvider answers from a fixture only
+(DISTANCE_PROVIDER=replay, DISTANCE_FIXTURE=path), so quoting can be load-tested
+or regression-tested offline with the same miles every run. A lane missing from
+the fixture comes back as status "error", exactly like Google being down.
+
+Neither provider is cacheable, so both bypass the shared distance cache: a
+recording sees every lane the run asks for (a warm cache would otherwise hide
+lanes from the fixture), and a replay can't be answered from a local
+distance_cache.db instead of the fixture.
+
+    python -m quote.distance_replay [distance_cache.db] [distance_fixture.jsonl]   # fixture from cached lanes
+"""
+import json
+import sqlite3
+import sys
+import threading
+
+try:
+    from quote.distance import FIXTURE_PATH, DistanceProvider, DistanceResult
+    from quote.distance_cache import CACHE_PATH, lane_key
+except ImportError:
+    from distance import FIXTURE_PATH, DistanceProvider, DistanceResult
+    from distance_cache import CACHE_PATH, lane_key
+
+
+def load_fixture(path: str = FIXTURE_PATH) -> dict:
+    """{(origin, destination): DistanceResult}; a lane recorded twice keeps its last entry."""
+    lanes = {}
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                key = lane_key(row["origin"], row["destination"])
+            except (ValueError, KeyError) as e:
+                raise ValueError(f"{path}:{line_no}: not a fixture line ({e})") from None
+            if key is not None:
+                lanes[key] = DistanceResult(row.get("miles"), row.get("status", "ok"), row.get("detail", ""), "replay")
+    return lanes
+
+
+class RecordingProvider(DistanceProvider):
+    """
+    Pass-through to another provider that appends each directions() result to a fixture
+    file. Not cacheable, so every lookup of the run reaches it and gets recorded.
+    """
+
+    cacheable = False
+
+    def __init__(self, inner: DistanceProvider, path: str):
+        self.inner = inner
+        self.path = path
+        self.name = inner.name
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        # breaker, session, ... of the wrapped provider
+        return getattr(self.inner, attr)
+
+    def _record(self, results):
+        lines = []
+        for (o, d), result in results:
+            key = lane_key(o, d)
+            # Outages say nothing about the lane, so they aren't worth replaying
+            if key is not None and result.status not in ("timeout", "circuit_open", "no_api_key"):
+                lines.append(json.dumps({"origin": key[0], "destination": key[1], "miles": result.miles, "status": result.status, "detail": result.detail}))
+        if lines:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def directions(self, o: str, d: str) -> DistanceResult:
+        result = self.inner.directions(o, d)
+        self._record([((o, d), result)])
+        return result
+
+    def miles_many(self, pairs) -> dict:
+        found = self.inner.miles_many(pairs)
+        self._record(((o, d), DistanceResult(miles, "ok", "", self.name)) for (o, d), miles in found.items() if miles is not None)
+        return found
+
+
+class ReplayProvider(DistanceProvider):
+    """Answers only from a recorded fixture; never touches the network or the distance cache."""
+
+    name = "replay"
+    cacheable = False
+
+    def __init__(self, path: str = FIXTURE_PATH):
+        self.path = path
+        self.lanes = load_fixture(path)
+        self.hits = 0
+        self.misses = 0
+
+    def directions(self, o: str, d: str) -> DistanceResult:
+        result = self.lanes.get(lane_key(o, d))
+        if result is None:
+            self.misses += 1
+            return DistanceResult(None, "error", "lane not in replay fixture", self.name)
+        self.hits += 1
+        return result
+
+
+def fixture_from_cache(cache_path: str = CACHE_PATH, out_path: str = FIXTURE_PATH) -> int:
+    """Write every cached lane as a fixture line; returns the lane count."""
+    with sqlite3.connect(cache_path) as conn:
+        rows = conn.execute("SELECT origin, destination, miles FROM distances ORDER BY origin, destination").fetchall()
+    with open(out_path, "w", encoding="utf-8") as f:
+        for o, d, miles in rows:
+            f.write(json.dumps({"origin": o, "destination": d, "miles": miles, "status": "ok", "detail": ""}) + "\n")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    cache = sys.argv[1] if len(sys.argv) > 1 else CACHE_PATH
+    out = sys.argv[2] if len(sys.argv) > 2 else FIXTURE_PATH
+    print(f"{fixture_from_cache(cache, out):,} lanes -> {out}")
@@ -0,0 +1,191 @@
+# File: distance_stub.py
+"""
+Local stand-in for the Google Maps Directions and Distance Matrix APIs.
+
+Serves /directions/json and /distancematrix/json on localhost with the same
+response shapes Google uses, so the real DistanceClient (deadline, retries,
+circuit breaker, batching) can be exercised and benchmarked with no network.
+Miles come from a replay fixture when it has the lane, otherwise from the ZIP
+centroid estimate; ZIPs with neither get ZERO_RESULTS / NOT_FOUND.
+
+Latency and failures are configurable and deterministic: whether a request
+fails, and how much jitter it gets, is a hash of (seed, query, how many times
+that exact query was asked), so a run is reproducible however threads interleave.
+
+    python -m quote.distance_stub --port 8765 --latency 0.05 --jitter 0.02 --error-rate 0.05
+    GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8765 GOOGLE_MAPS_API_KEY=stub streamlit run app.py
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from quote.distance_cache import lane_key
+    from quote.distance_replay import load_fixture
+    from quote.geo import estimate_miles
+except ImportError:
+    from distance_cache import lane_key
+    from distance_replay import load_fixture
+    from geo import estimate_miles
+
+METERS_PER_MILE = 1609.344
+
+
+class StubMapsServer:
+    """
+    Threaded fake Maps API. Use as a context manager or start()/stop():
+
+        with StubMapsServer(latency=0.02, error_rate=0.1) as stub:
+            client = DistanceClient(base_url=stub.url, api_key="stub")
+
+    error_rate is the fraction of requests answered with HTTP 503 (retryable);
+    over_limit_rate the fraction answered OVER_QUERY_LIMIT.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        over_limit_rate: float = 0.0,
+        seed: int = 0,
+        fixture_path: str | None = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.over_limit_rate = over_limit_rate
+        self.seed = seed
+        self.lanes = load_fixture(fixture_path) if fixture_path else {}
+        self.counts = {"requests": 0, "errors": 0, "over_limit": 0, "elements": 0}
+        self._seen: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubMapsServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="maps-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _draws(self, query: str) -> tuple[float, float]:
+        """Two uniform [0, 1) draws fixed by (seed, query, repeat count)."""
+        with self._lock:
+            n = self._seen.get(query, 0)
+            self._seen[query] = n + 1
+            self.counts["requests"] += 1
+        h = zlib.crc32(f"{self.seed}|{query}|{n}".encode())
+        return (h & 0xFFFF) / 0x10000, (h >> 16) / 0x10000
+
+    def miles(self, origin: str, destination: str) -> float | None:
+        key = lane_key(origin, destination)
+        if key is None:
+            return None
+        recorded = self.lanes.get(key)
+        if recorded is not None:
+            return recorded.miles
+        return estimate_miles(*key)
+
+    def _element(self, origin: str, destination: str) -> dict:
+        miles = self.miles(origin, destination)
+        if miles is None:
+            return {"status": "NOT_FOUND"}
+        return {"status": "OK", "distance": {"value": round(miles * METERS_PER_MILE), "text": f"{miles:,.0f} mi"}}
+
+    def respond(self, path: str, query: str) -> tuple[int, dict | None]:
+        fail, jitter = self._draws(query)
+        delay = self.latency + self.jitter * (2 * jitter - 1)
+        if delay > 0:
+            time.sleep(delay)
+        if fail < self.error_rate:
+            with self._lock:
+                self.counts["errors"] += 1
+            return 503, None
+        if fail < self.error_rate + self.over_limit_rate:
+            with self._lock:
+                self.counts["over_limit"] += 1
+            return 200, {"status": "OVER_QUERY_LIMIT", "error_message": "stub quota"}
+
+        params = {k: v[0] for k, v in parse_qs(query).items()}
+        if path.endswith("/directions/json"):
+            element = self._element(params.get("origin", ""), params.get("destination", ""))
+            with self._lock:
+                self.counts["elements"] += 1
+            if element["status"] != "OK":
+                return 200, {"status": "ZERO_RESULTS", "routes": []}
+            return 200, {"status": "OK", "routes": [{"legs": [{"distance": element["distance"]}]}]}
+        if path.endswith("/distancematrix/json"):
+            origins = params.get("origins", "").split("|")
+            destinations = params.get("destinations", "").split("|")
+            with self._lock:
+                self.counts["elements"] += len(origins) * len(destinations)
+            rows = [{"elements": [self._element(o, d) for d in destinations]} for o in origins]
+            return 200, {"status": "OK", "rows": rows}
+        return 404, None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = "&".join(p for p in url.query.split("&") if not p.startswith("key="))
+                code, body = server.respond(url.path, query)
+                payload = json.dumps(body).encode() if body is not None else b""
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Google Maps distance API on localhost.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of deterministic jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered HTTP 503")
+    parser.add_argument("--over-limit-rate", type=float, default=0.0, help="fraction answered OVER_QUERY_LIMIT")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixture", default=None, help="replay fixture to take miles from")
+    args = parser.parse_args()
+    stub = StubMapsServer(
+        args.host, args.port, args.latency, args.jitter, args.error_rate, args.over_limit_rate, args.seed, args.fixture
+    )
+    print(f"Maps stub on {stub.url} (set GOOGLE_MAPS_BASE_URL to it and any GOOGLE_MAPS_API_KEY)")
+    try:
+        stub.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(stub.counts)
@@ -1,19 +1,18 @@
 # Directory: quote/
 # File: email_form.py
 import streamlit as st
-from db import Session, EmailQuoteRequest, Quote
+from quote.write_behind import find_quote, save_email_request
 import urllib.parse
 import csv
 from io import StringIO
-import pandas as pd
 import streamlit.components.v1 as components
 
 
 # Workbook helpers & Air math
 try:
-    from quote.utils import normalize_workbook  # read/normalize workbook sheets
+    from quote.rate_card import get_rate_card  # shared, read-only workbook sheets
 except Exception:
-    normalize_workbook = None
+    get_rate_card = None
 
 try:
     from quote.logic_air import calculate_air_quote  # recompute pre-guarantee Air total
@@ -26,12 +25,8 @@ ADMIN_FEE = 15.00  # Email-only processing fee
 
 # ---------- DB & workbook helpers ----------
 def _load_quote_from_db(quote_id: str):
-    """Fetch a quote by UUID and map to the dict shape this UI expects."""
-    if not quote_id:
-        return None
-    db = Session()
-    q = db.query(Quote).filter(Quote.quote_id == quote_id).first()
-    db.close()
+    """Fetch a quote by UUID (queued or saved) and map to the dict shape this UI expects."""
+    q = find_quote(quote_id)
     if not q:
         return None
     accessorials = []
@@ -49,24 +44,6 @@ def _load_quote_from_db(quote_id: str):
     }
 
 
-def _first_numeric(series: pd.Series) -> float:
-    """Return the first numeric-looking value in a column; handle $, commas, %, and skip instructions."""
-    for val in series.tolist():
-        s = str(val).strip()
-        if not s:
-            continue
-        if "multiply" in s.lower():
-            continue
-        s = s.replace("$", "").replace(",", "")
-        if s.endswith("%"):
-            continue
-        try:
-            return float(s)
-        except Exception:
-            continue
-    return 0.0
-
-
 def _accessorial_prices(selected_names):
     """
     Return ([(name, price), ...], subtotal) from Accessorials sheet headers.
@@ -75,22 +52,26 @@ def _accessorial_prices(selected_names):
     names = [n for n in (selected_names or []) if "guarantee" not in str(n).lower()]
 
     try:
-        wb = pd.read_excel("HotShot Quote.xlsx", sheet_name=None)
-        if normalize_workbook:
-            wb = normalize_workbook(wb)
-        df = wb["Accessorials"]
+        accessorials = get_rate_card().accessorials  # same compiled table the quote page uses
     except Exception:
         return [(name, 0.0) for name in names], 0.0
 
     rows, subtotal = [], 0.0
     for name in names:
-        price = _first_numeric(df[name]) if name in df.columns else 0.0
-        price = float(price or 0.0)
+        price = float(accessorials.fixed_price(name) or 0.0)
         rows.append((name, price))
         subtotal += price
     return rows, round(subtotal, 2)
 
 
+def _guarantee_factor(selected_names) -> float:
+    """The multiplier the quote page applied for Guarantee (compiled from the workbook; 1.25 if it can't be read)."""
+    try:
+        return get_rate_card().accessorials.multiplier(selected_names or [])
+    except Exception:
+        return 1.25
+
+
 # ---------- session hydration ----------
 def _hydrate_query_params():
     """Supports both modern and legacy Streamlit query params APIs."""
@@ -216,8 +197,7 @@ def email_form_ui():
         return
 
     # -------------------- Save request --------------------
-    db = Session()
-    new_request = EmailQuoteRequest(
+    save_email_request(
         quote_id=quote_id or "",
         shipper_name=shipper_name,
         shipper_address=shipper_address,
@@ -230,9 +210,6 @@ def email_form_ui():
         total_weight=float(total_weight),
         special_instructions=special_instructions
     )
-    db.add(new_request)
-    db.commit()
-    db.close()
     st.success("Quote request saved!")
 
     # -------------------- CSV export --------------------
@@ -265,15 +242,14 @@ def email_form_ui():
 
     # Guarantee amount:
     # Recompute the pre‑guarantee Air total using the same logic as the quote screen,
-    # then take 25% of that base. Fallback to 20% of stored total if workbook/logic unavailable.
+    # then take the Guarantee share of that base. Fallback: back it out of the stored total.
     guarantee_amount = 0.0
+    guarantee_factor = _guarantee_factor(selected_accessorials)
     if guarantee_selected and str(quote_details.get("quote_type", "")).lower() == "air":
         pre_air_total = None
         try:
-            if calculate_air_quote is not None:
-                wb = pd.read_excel("HotShot Quote.xlsx", sheet_name=None)
-                if normalize_workbook:
-                    wb = normalize_workbook(wb)
+            if calculate_air_quote is not None and get_rate_card is not None:
+                wb = get_rate_card()
                 pre = calculate_air_quote(
                     origin=quote_details.get("origin", ""),
                     destination=quote_details.get("destination", ""),
@@ -286,10 +262,10 @@ def email_form_ui():
             pre_air_total = None
 
         if pre_air_total is not None and pre_air_total > 0:
-            guarantee_amount = round(pre_air_total * 0.25, 2)
+            guarantee_amount = round(pre_air_total * (guarantee_factor - 1.0), 2)
         else:
             # Safe fallback if we couldn't recompute base
-            guarantee_amount = round(base_total * 0.20, 2) if base_total > 0 else 0.0
+            guarantee_amount = round(base_total - base_total / guarantee_factor, 2) if base_total > 0 else 0.0
 
     acc_plus_guarantee_subtotal = round(float(acc_subtotal or 0.0) + float(guarantee_amount or 0.0), 2)
 
@@ -313,7 +289,7 @@ def email_form_ui():
     lines.append(SEP)
 
     if guarantee_selected:
-        lines.append(f"{'Guarantee (25%)':<{NAME_COL}}{_fmt_money(guarantee_amount):>{AMT_COL}}")
+        lines.append(f"{f'Guarantee ({guarantee_factor - 1.0:.0%})':<{NAME_COL}}{_fmt_money(guarantee_amount):>{AMT_COL}}")
         lines.append(SEP)
         lines.append(_line("Accessorials + Guarantee Subtotal:", acc_plus_guarantee_subtotal))
         lines.append(SEP)
@@ -0,0 +1,177 @@
+# File: geo.py
+"""
+ZIP centroids and straight-line mileage.
+
+quote/data/zip_centroids.csv.gz holds one (lat, lon) per 5-digit ZIP. It is
+loaded into two dense float arrays indexed like ZipZoneIndex (one slot per
+possible ZIP), so any number of lanes can be measured with one vectorized
+haversine. Straight-line miles times a road-circuity factor give a quick
+driving-mile estimate without calling Google.
+
+    python -m quote.geo 2023_Gaz_zcta_national.txt   # rebuild from a Census ZCTA gazetteer
+    python -m quote.geo --check-bounds               # test mileage_bounds() against cached Google miles
+"""
+import csv
+import gzip
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    from quote.utils import ReadOnly
+    from quote.zip_index import SLOTS, zip_key, zip_keys
+except ImportError:
+    from utils import ReadOnly
+    from zip_index import SLOTS, zip_key, zip_keys
+
+CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "zip_centroids.csv.gz")
+EARTH_RADIUS_MILES = 3958.7613
+# Typical ratio of driving miles to straight-line miles for US road trips
+CIRCUITY = float(os.getenv("DISTANCE_CIRCUITY_FACTOR", "1.2"))
+# Bounds on driving miles: centroids can sit this far from where Google geocodes a ZIP,
+# and no road trip is assumed to be more than MAX_CIRCUITY times the straight line
+CENTROID_SLACK_MILES = float(os.getenv("DISTANCE_CENTROID_SLACK_MILES", "1.5"))
+MAX_CIRCUITY = float(os.getenv("DISTANCE_MAX_CIRCUITY", "2.0"))
+# The upper bound is a heuristic, so a lookup is only skipped when the band still holds
+# with the upper bound stretched by this factor (see logic_hotshot.certain_zone)
+BOUND_MARGIN = float(os.getenv("DISTANCE_BOUND_MARGIN", "1.25"))
+
+
+def haversine_miles(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle miles between points given in degrees; works on scalars or arrays (NaN in, NaN out)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class ZipCentroids(ReadOnly):
+    """ZIP -> (lat, lon) as dense float32 arrays; NaN for ZIPs without a centroid."""
+
+    __slots__ = ("lat", "lon")
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        for arr in (lat, lon):
+            arr.flags.writeable = False
+        self._init(lat=lat, lon=lon)
+
+    @classmethod
+    def from_csv(cls, path: str = CENTROIDS_PATH) -> "ZipCentroids":
+        df = pd.read_csv(path, dtype={"zip": str})
+        keys = zip_keys(df["zip"])
+        ok = keys >= 0
+        lat = np.full(SLOTS, np.nan, dtype=np.float32)
+        lon = np.full(SLOTS, np.nan, dtype=np.float32)
+        lat[keys[ok]] = df["lat"].to_numpy(dtype=np.float32)[ok]
+        lon[keys[ok]] = df["lon"].to_numpy(dtype=np.float32)[ok]
+        return cls(lat, lon)
+
+    def straight_miles(self, origins, destinations) -> np.ndarray:
+        """Straight-line miles per lane (vectorized); NaN where either ZIP has no centroid."""
+        o = zip_keys(origins)
+        d = zip_keys(destinations)
+        oi, di = np.maximum(o, 0), np.maximum(d, 0)
+        miles = haversine_miles(self.lat[oi], self.lon[oi], self.lat[di], self.lon[di])
+        return np.where((o >= 0) & (d >= 0), miles, np.nan)
+
+    def estimate_miles(self, origins, destinations, circuity: float = CIRCUITY) -> np.ndarray:
+        """Estimated driving miles per lane: straight-line miles times the circuity factor."""
+        return self.straight_miles(origins, destinations) * circuity
+
+    def __contains__(self, zipcode) -> bool:
+        slot = zip_key(zipcode)
+        return slot is not None and not np.isnan(self.lat[slot])
+
+    def __len__(self) -> int:
+        return int((~np.isnan(self.lat)).sum())
+
+
+_centroids: ZipCentroids | None = None
+_centroids_lock = threading.Lock()
+
+
+def get_centroids() -> ZipCentroids:
+    """Process-wide centroid table, loaded on first use (~50 ms)."""
+    global _centroids
+    if _centroids is None:
+        with _centroids_lock:
+            if _centroids is None:
+                _centroids = ZipCentroids.from_csv()
+    return _centroids
+
+
+def estimate_miles(origin, destination, circuity: float = CIRCUITY) -> float | None:
+    """Estimated driving miles for one lane, or None if either ZIP has no centroid."""
+    c = get_centroids()
+    o, d = zip_key(origin), zip_key(destination)
+    if o is None or d is None:
+        return None
+    miles = float(haversine_miles(c.lat[o], c.lon[o], c.lat[d], c.lon[d])) * circuity
+    return None if np.isnan(miles) else miles
+
+
+def mileage_bounds(origin, destination) -> tuple[float, float] | None:
+    """
+    (lower, upper) driving miles for a lane from centroids alone, or None if either ZIP
+    has no centroid. Driving is never shorter than the straight line between the two
+    geocoded points (less the centroid slack on each end), and is assumed to be at
+    most MAX_CIRCUITY times it; check that against real lookups with --check-bounds.
+    """
+    straight = estimate_miles(origin, destination, circuity=1.0)
+    if straight is None:
+        return None
+    slack = 2 * CENTROID_SLACK_MILES
+    return max(0.0, straight - slack), straight * MAX_CIRCUITY + slack
+
+
+def check_bounds(cache_path: str) -> dict:
+    """
+    How often mileage_bounds() held for the Google distances in a distance cache file,
+    with and without BOUND_MARGIN, and the worst circuity seen (tune MAX_CIRCUITY from it).
+    """
+    import sqlite3
+    with sqlite3.connect(cache_path) as conn:
+        df = pd.read_sql_query("SELECT origin, destination, miles FROM distances", conn)
+    straight = get_centroids().straight_miles(df["origin"], df["destination"])
+    known = ~np.isnan(straight)
+    lower = np.maximum(0.0, straight - 2 * CENTROID_SLACK_MILES)
+    upper = straight * MAX_CIRCUITY + 2 * CENTROID_SLACK_MILES
+    miles = df["miles"].to_numpy(dtype=float)
+    circuity = np.where(known & (straight > 1), miles / np.where(straight > 1, straight, 1.0), np.nan)
+    measured = not np.isnan(circuity).all()
+    return {
+        "lanes": int(known.sum()),
+        "below_lower": int((known & (miles < lower)).sum()),
+        "above_upper": int((known & (miles > upper)).sum()),
+        "above_upper_with_margin": int((known & (miles > upper * BOUND_MARGIN)).sum()),
+        "median_circuity": float(np.nanmedian(circuity)) if measured else float("nan"),
+        "max_circuity": float(np.nanmax(circuity)) if measured else float("nan"),
+    }
+
+
+def build_centroids(gazetteer_path: str, out_path: str = CENTROIDS_PATH) -> int:
+    """Rewrite the bundled table from a Census ZCTA gazetteer file (GEOID, INTPTLAT, INTPTLONG columns)."""
+    df = pd.read_csv(gazetteer_path, sep="\t", dtype={"GEOID": str})
+    df.columns = df.columns.str.strip()
+    rows = sorted(
+        (f"{int(g):05d}", round(float(lat), 4), round(float(lon), 4))
+        for g, lat, lon in zip(df["GEOID"], df["INTPTLAT"], df["INTPTLONG"])
+    )
+    with gzip.open(out_path, "wt", newline="") as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(["zip", "lat", "lon"])
+        w.writerows(rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    if sys.argv[1] == "--check-bounds":
+        # python -m quote.geo --check-bounds [distance_cache.db]
+        print(check_bounds(sys.argv[2] if len(sys.argv) > 2 else "distance_cache.db"))
+    else:
+        print(f"{build_centroids(sys.argv[1])} ZIPs -> {CENTROIDS_PATH}")
@@ -1,86 +1,142 @@
 # File: logic_air.py
+from types import MappingProxyType
+import numpy as np
 import pandas as pd
+try:
+    from quote.utils import ReadOnly, find_columns, parse_money
+    from quote.zip_index import ZipZoneIndex, zip_keys
+except ImportError:
+    from utils import ReadOnly, find_columns, parse_money
+    from zip_index import ZipZoneIndex, zip_keys
 
-def calculate_air_quote(origin, destination, weight, accessorial_total, workbook):
-    zip_zone_df = workbook["ZIP CODE ZONES"]
-    cost_zone_table = workbook["COST ZONE TABLE"]
-    air_cost_df = workbook["Air Cost Zone"]
-    beyond_df = workbook["Beyond Price"]
-
-    # Dynamically find column names to prevent KeyErrors
-    col_map = {
-        'ZIPCODE': next((col for col in zip_zone_df.columns if 'ZIPCODE' in col.upper()), None),
-        'DEST ZONE': next((col for col in zip_zone_df.columns if 'DEST ZONE' in col.upper()), None),
-        'BEYOND': next((col for col in zip_zone_df.columns if 'BEYOND' in col.upper()), None),
-        'CONCATENATE': next((col for col in cost_zone_table.columns if 'CONCATENATE' in col.upper()), None),
-        'COST ZONE': next((col for col in cost_zone_table.columns if 'COST ZONE' in col.upper()), None),
-        'AIR COST ZONE': next((col for col in air_cost_df.columns if 'ZONE' in col.upper()), None),
-        'MIN': next((col for col in air_cost_df.columns if 'MIN' in col.upper()), None),
-        'PER LB': next((col for col in air_cost_df.columns if 'PER LB' in col.upper()), None),
-        'WEIGHT BREAK': next((col for col in air_cost_df.columns if 'WEIGHT BREAK' in col.upper()), None),
-        'BEYOND ZONE': next((col for col in beyond_df.columns if 'ZONE' in col.upper()), None),
-        'BEYOND RATE': next((col for col in beyond_df.columns if 'RATE' in col.upper()), None),
+
+class AirRateTable(ReadOnly):
+    """
+    "COST ZONE TABLE" + "Air Cost Zone" + "Beyond Price" compiled for one rate-card version.
+
+    cost[orig_zone, dest_zone] = (min charge, per lb, weight break); valid marks the
+    zone pairs that resolve to a row in "Air Cost Zone".
+    """
+
+    __slots__ = ("cost", "valid", "cost_zones", "beyond_rates")
+
+    # sheet -> {key: substring the header must contain}
+    COLUMNS = {
+        "COST ZONE TABLE": {'CONCATENATE': 'CONCATENATE', 'COST ZONE': 'COST ZONE'},
+        "Air Cost Zone": {'AIR COST ZONE': 'ZONE', 'MIN': 'MIN', 'PER LB': 'PER LB', 'WEIGHT BREAK': 'WEIGHT BREAK'},
+        "Beyond Price": {'BEYOND ZONE': 'ZONE', 'BEYOND RATE': 'RATE'},
     }
 
-    for key, col in col_map.items():
-        if col is None:
-            raise KeyError(f"Could not find a column containing '{key}' in the workbook. Please check your sheet headers.")
+    def __init__(self, cost: np.ndarray, valid: np.ndarray, cost_zones: np.ndarray, beyond_rates: dict):
+        for arr in (cost, valid, cost_zones):
+            arr.flags.writeable = False
+        self._init(
+            cost=cost,
+            valid=valid,
+            cost_zones=cost_zones,                          # object matrix of cost-zone letters, for messages/reporting
+            beyond_rates=MappingProxyType(dict(beyond_rates)),  # beyond code -> charge
+        )
+
+    @classmethod
+    def from_workbook(cls, workbook, zip_index: ZipZoneIndex, cols: dict | None = None) -> "AirRateTable":
+        cost_zone_table = workbook["COST ZONE TABLE"]
+        air_cost_df = workbook["Air Cost Zone"]
+        beyond_df = workbook["Beyond Price"]
+
+        if cols is None:
+            cols = {}
+            for sheet, wanted in cls.COLUMNS.items():
+                cols.update(find_columns(workbook[sheet], wanted, sheet))
+        col_map = cols
+
+        # Cost zone per "Concatenate" key (first row wins), keyed the way the sheet was always matched
+        concat_keys = pd.to_numeric(cost_zone_table[col_map['CONCATENATE']], errors='coerce').astype(str)
+        cost_zone_by_key = {}
+        for key, cz in zip(concat_keys, cost_zone_table[col_map['COST ZONE']]):
+            cost_zone_by_key.setdefault(key, cz)
+
+        # Air cost row per cost zone (first row wins)
+        air_rows = {}
+        for zone, row in zip(air_cost_df[col_map['AIR COST ZONE']].astype(str).str.strip(), air_cost_df.to_dict("records")):
+            air_rows.setdefault(zone, row)
+
+        n = max(int(zip_index.zones.max()), 0) + 1
+        cost = np.full((n, n, 3), np.nan)
+        valid = np.zeros((n, n), dtype=bool)
+        cost_zones = np.full((n, n), None, dtype=object)
+        for o in range(n):
+            for d in range(n):
+                cz = cost_zone_by_key.get(str(int(f"{o}{d}")))
+                if cz is None:
+                    continue
+                cost_zones[o, d] = cz
+                row = air_rows.get(str(cz).strip())
+                if row is None:
+                    continue
+                try:
+                    cost[o, d] = (
+                        parse_money(row[col_map['MIN']]),
+                        parse_money(row[col_map['PER LB']]),
+                        parse_money(row[col_map['WEIGHT BREAK']]),
+                    )
+                except ValueError:
+                    continue
+                valid[o, d] = True
+
+        beyond_rates = {}
+        for zone, rate in zip(beyond_df[col_map['BEYOND ZONE']].astype(str).str.strip().str.upper(), beyond_df[col_map['BEYOND RATE']]):
+            if zone in beyond_rates:
+                continue
+            try:
+                beyond_rates[zone] = parse_money(rate)
+            except ValueError:
+                beyond_rates[zone] = 0.0
+
+        return cls(cost, valid, cost_zones, beyond_rates)
 
-    # Convert the ZIPCODE column to a string for a proper comparison
-    zip_zone_df[col_map['ZIPCODE']] = zip_zone_df[col_map['ZIPCODE']].astype(str).str.strip()
+    def lookup(self, orig_zone: int, dest_zone: int) -> tuple[float, float, float]:
+        """(min charge, per lb, weight break) for a zone pair."""
+        n = self.valid.shape[0]
+        if not (0 <= orig_zone < n and 0 <= dest_zone < n and self.valid[orig_zone, dest_zone]):
+            raise KeyError(f"No Air cost zone for zone pair {orig_zone}->{dest_zone}. Please check the COST ZONE TABLE / Air Cost Zone sheets.")
+        min_charge, per_lb, weight_break = self.cost[orig_zone, dest_zone]
+        return float(min_charge), float(per_lb), float(weight_break)
 
-    orig_zone = int(zip_zone_df[zip_zone_df[col_map['ZIPCODE']] == origin][col_map['DEST ZONE']].values[0])
-    dest_zone = int(zip_zone_df[zip_zone_df[col_map['ZIPCODE']] == destination][col_map['DEST ZONE']].values[0])
+    def beyond_rate(self, zone_code) -> float:
+        if not zone_code:
+            return 0.0
+        return self.beyond_rates.get(zone_code, 0.0)
+
+
+def _compiled(workbook) -> tuple[ZipZoneIndex, AirRateTable]:
+    # A RateCard carries the compiled index/matrix for its version; plain workbook dicts compile on the fly
+    zip_index = getattr(workbook, "zip_index", None)
+    if zip_index is None:
+        zip_index = ZipZoneIndex.from_sheet(workbook["ZIP CODE ZONES"])
+    air_rates = getattr(workbook, "air_rates", None)
+    if air_rates is None:
+        air_rates = AirRateTable.from_workbook(workbook, zip_index)
+    return zip_index, air_rates
+
+
+def calculate_air_quote(origin, destination, weight, accessorial_total, workbook):
+    zip_index, air_rates = _compiled(workbook)
+
+    orig_zone = zip_index.dest_zone(origin)
+    dest_zone = zip_index.dest_zone(destination)
     concat = int(f"{orig_zone}{dest_zone}")
-    
-    # Corrected: Use the dynamically found column name for 'CONCATENATE'
-    cost_zone_table[col_map['CONCATENATE']] = pd.to_numeric(cost_zone_table[col_map['CONCATENATE']], errors='coerce').astype(str)
-    
-    # Corrected: Use the dynamically found column name for 'COST ZONE'
-    cost_zone = cost_zone_table[cost_zone_table[col_map['CONCATENATE']] == str(concat)][col_map['COST ZONE']].values[0]
-    
-    # Corrected: Use the dynamically found column name for the ZONE column in the 'Air Cost Zone' sheet
-    air_cost_df[col_map['AIR COST ZONE']] = air_cost_df[col_map['AIR COST ZONE']].astype(str)
-    
-    cost_row = air_cost_df[air_cost_df[col_map['AIR COST ZONE']].str.strip() == str(cost_zone).strip()].iloc[0]
-
-    min_charge = float(cost_row[col_map['MIN']])
-    per_lb = float(str(cost_row[col_map['PER LB']]).replace("$", "").replace(",", ""))
-    weight_break = float(cost_row[col_map['WEIGHT BREAK']])
-    
+
+    min_charge, per_lb, weight_break = air_rates.lookup(orig_zone, dest_zone)
+
     if weight > weight_break:
         base = ((weight - weight_break) * per_lb) + min_charge
     else:
         base = min_charge
 
-    def get_beyond_zone(zipcode):
-        row = zip_zone_df[zip_zone_df[col_map['ZIPCODE']] == str(zipcode)]
-        if not row.empty and col_map['BEYOND'] in row.columns:
-            val = str(row[col_map['BEYOND']].values[0]).strip().upper()
-            if val in ("", "N/A", "NO", "NONE", "NAN"):
-                return None
-            return val.split()[-1]
-        return None
-
-    def get_beyond_rate(zone_code):
-        if not zone_code:
-            return 0.0
-        
-        # Corrected: Use dynamic column names for beyond_df
-        beyond_df[col_map['BEYOND ZONE']] = beyond_df[col_map['BEYOND ZONE']].astype(str)
-        
-        match = beyond_df[beyond_df[col_map['BEYOND ZONE']].str.strip().str.upper() == zone_code]
-        if not match.empty:
-            try:
-                return float(str(match[col_map['BEYOND RATE']].values[0]).replace("$", "").replace(",", "").strip())
-            except Exception:
-                return 0.0
-        return 0.0
-
-    origin_beyond = get_beyond_zone(origin)
-    dest_beyond = get_beyond_zone(destination)
-    origin_charge = get_beyond_rate(origin_beyond)
-    dest_charge = get_beyond_rate(dest_beyond)
+    origin_beyond = zip_index.beyond_code(origin)
+    dest_beyond = zip_index.beyond_code(destination)
+    origin_charge = air_rates.beyond_rate(origin_beyond)
+    dest_charge = air_rates.beyond_rate(dest_beyond)
     beyond_total = origin_charge + dest_charge
 
     quote_total = base + accessorial_total + beyond_total
@@ -96,4 +152,100 @@ def calculate_air_quote(origin, destination, weight, accessorial_total, workbook
         "origin_charge": origin_charge,
         "dest_charge": dest_charge,
         "beyond_total": beyond_total
-    }
\ No newline at end of file
+    }
+
+
+def calculate_air_quotes_batch(df: pd.DataFrame, workbook=None) -> pd.DataFrame:
+    """
+    Price many Air lanes at once.
+
+    df needs "origin", "destination" and "weight" columns; "accessorial_total" is optional
+    (0 if missing). Returns a frame on df's index with the same fields calculate_air_quote
+    returns, plus "error" (None when the row priced). Rows that can't be priced (unknown
+    ZIPs or zones, a missing, non-numeric or non-positive weight) get NaN amounts and an
+    error message, instead of failing the batch.
+    """
+    if workbook is None:
+        try:
+            from quote.rate_card import get_rate_card
+        except ImportError:
+            from rate_card import get_rate_card
+        workbook = get_rate_card()
+    zip_index, air_rates = _compiled(workbook)
+
+    n = len(df)
+    weight = pd.to_numeric(df["weight"], errors="coerce").to_numpy(dtype=float)
+    if "accessorial_total" in df.columns:
+        accessorial_total = pd.to_numeric(df["accessorial_total"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    else:
+        accessorial_total = np.zeros(n)
+
+    okeys = zip_keys(df["origin"])
+    dkeys = zip_keys(df["destination"])
+    oz = zip_index.zones_for(okeys).astype(np.int64)
+    dz = zip_index.zones_for(dkeys).astype(np.int64)
+
+    size = air_rates.valid.shape[0]
+    in_range = (oz >= 0) & (oz < size) & (dz >= 0) & (dz < size)
+    oi, di = np.where(in_range, oz, 0), np.where(in_range, dz, 0)
+    ok = in_range & air_rates.valid[oi, di]
+
+    cells = air_rates.cost[oi, di]
+    min_charge = np.where(ok, cells[:, 0], np.nan)
+    per_lb = np.where(ok, cells[:, 1], np.nan)
+    weight_break = np.where(ok, cells[:, 2], np.nan)
+    base = np.where(weight > weight_break, ((weight - weight_break) * per_lb) + min_charge, min_charge)
+
+    codes = np.array(zip_index.beyond_codes, dtype=object)
+    charges = np.array([air_rates.beyond_rate(c) for c in zip_index.beyond_codes], dtype=float)
+    o_ids = zip_index.beyond[np.maximum(okeys, 0)]
+    d_ids = zip_index.beyond[np.maximum(dkeys, 0)]
+    origin_charge = np.where(ok, charges[o_ids], np.nan)
+    dest_charge = np.where(ok, charges[d_ids], np.nan)
+    beyond_total = origin_charge + dest_charge
+
+    quote_total = base + accessorial_total + beyond_total
+
+    # A weight that isn't a positive number prices nothing, however cheap the lane
+    bad_weight = ok & ~(weight > 0)
+    if bad_weight.any():
+        quote_total = np.where(bad_weight, np.nan, quote_total)
+        min_charge = np.where(bad_weight, np.nan, min_charge)
+        per_lb = np.where(bad_weight, np.nan, per_lb)
+        weight_break = np.where(bad_weight, np.nan, weight_break)
+        origin_charge = np.where(bad_weight, np.nan, origin_charge)
+        dest_charge = np.where(bad_weight, np.nan, dest_charge)
+        beyond_total = np.where(bad_weight, np.nan, beyond_total)
+
+    # int(f"{orig_zone}{dest_zone}")
+    dest_digits = np.floor(np.log10(np.maximum(di, 1))).astype(np.int64) + 1
+    zone = pd.array(np.where(ok, oi * 10 ** dest_digits + di, 0), dtype="Int64")
+    zone[~ok] = pd.NA
+
+    error = np.full(n, None, dtype=object)
+    origins = df["origin"].to_numpy(dtype=object)
+    destinations = df["destination"].to_numpy(dtype=object)
+    for i in np.flatnonzero(~ok):
+        if oz[i] < 0:
+            error[i] = f"ZIP code {origins[i]!r} not found in ZIP CODE ZONES"
+        elif dz[i] < 0:
+            error[i] = f"ZIP code {destinations[i]!r} not found in ZIP CODE ZONES"
+        else:
+            error[i] = f"No Air cost zone for zone pair {oz[i]}->{dz[i]}. Please check the COST ZONE TABLE / Air Cost Zone sheets."
+    raw_weights = df["weight"].to_numpy(dtype=object)
+    for i in np.flatnonzero(bad_weight):
+        error[i] = f"Invalid weight {raw_weights[i]!r}: expected a positive number of lbs"
+
+    return pd.DataFrame({
+        "zone": zone,
+        "quote_total": quote_total,
+        "min_charge": min_charge,
+        "per_lb": per_lb,
+        "weight_break": weight_break,
+        "origin_beyond": np.where(ok, codes[o_ids], None),
+        "dest_beyond": np.where(ok, codes[d_ids], None),
+        "origin_charge": origin_charge,
+        "dest_charge": dest_charge,
+        "beyond_total": beyond_total,
+        "error": error,
+    }, index=df.index)
@@ -1,46 +1,97 @@
 # File: logic_hotshot.py
 try:
-    from quote.distance import get_distance_miles
+    from quote.distance import DistanceUnavailableError, get_distances, lookup_distance
+    from quote.utils import ReadOnly, find_columns, parse_money
+    from quote.zip_index import zip_key
+    from quote.geo import BOUND_MARGIN, estimate_miles, mileage_bounds
 except ImportError:
-    from distance import get_distance_miles
+    from distance import DistanceUnavailableError, get_distances, lookup_distance
+    from utils import ReadOnly, find_columns, parse_money
+    from zip_index import zip_key
+    from geo import BOUND_MARGIN, estimate_miles, mileage_bounds
+from bisect import bisect_left
+import threading
+from types import MappingProxyType
+import numpy as np
 import pandas as pd
 
-def calculate_hotshot_quote(origin, destination, weight, accessorial_total, rates_df):
-    miles = get_distance_miles(origin, destination) or 0
-    zone = "X"
-    
-    # Dynamically find column names to prevent KeyErrors
-    col_map = {
-        'MILES': next((col for col in rates_df.columns if 'MILES' in col.upper()), None),
-        'ZONE': next((col for col in rates_df.columns if 'ZONE' in col.upper()), None),
-        'PER LB': next((col for col in rates_df.columns if 'PER LB' in col.upper()), None),
-        'FUEL': next((col for col in rates_df.columns if 'FUEL' in col.upper()), None),
-        'MIN': next((col for col in rates_df.columns if 'MIN' in col.upper()), None),
-        'WEIGHT BREAK': next((col for col in rates_df.columns if 'WEIGHT BREAK' in col.upper()), None)
-    }
 
-    for key, col in col_map.items():
-        if col is None:
-            raise KeyError(f"Could not find a column containing '{key}' in the Hotshot Rates sheet.")
+class ZoneRates(ReadOnly):
+    __slots__ = ("per_lb", "fuel", "min_charge", "weight_break")
+
+    def __init__(self, per_lb: float, fuel: float, min_charge: float, weight_break: float):
+        self._init(per_lb=per_lb, fuel=fuel, min_charge=min_charge, weight_break=weight_break)
+
+
+class HotshotRateTable(ReadOnly):
+    """
+    "Hotshot Rates" compiled for one rate-card version: sorted MILES thresholds with
+    the zone each one closes, plus the rates for every zone. Miles past the last
+    threshold fall in zone X.
+    """
+
+    __slots__ = ("thresholds", "zones", "rates")
+
+    SHEET = "Hotshot Rates"
+    COLUMNS = {'MILES': 'MILES', 'ZONE': 'ZONE', 'PER LB': 'PER LB', 'FUEL': 'FUEL', 'MIN': 'MIN', 'WEIGHT BREAK': 'WEIGHT BREAK'}
+
+    def __init__(self, thresholds, zones, rates: dict[str, ZoneRates]):
+        self._init(thresholds=tuple(thresholds), zones=tuple(zones), rates=MappingProxyType(dict(rates)))
+
+    @classmethod
+    def from_sheet(cls, rates_df: pd.DataFrame, cols: dict | None = None) -> "HotshotRateTable":
+        col_map = cols or find_columns(rates_df, cls.COLUMNS, cls.SHEET)
+
+        # Non-numeric MILES cells (typos) are skipped, as are rows without a zone
+        bands = pd.DataFrame({
+            "miles": pd.to_numeric(rates_df[col_map['MILES']], errors='coerce'),
+            "zone": rates_df[col_map['ZONE']],
+        }).dropna().sort_values("miles", kind="stable")
+
+        # First row per zone holds that zone's rates
+        rates = {}
+        for row in rates_df.to_dict("records"):
+            zone = str(row[col_map['ZONE']])
+            if zone in rates:
+                continue
+            try:
+                rates[zone] = ZoneRates(
+                    per_lb=parse_money(row[col_map['PER LB']]),
+                    fuel=parse_money(row[col_map['FUEL']]),
+                    min_charge=parse_money(row[col_map['MIN']]),
+                    weight_break=parse_money(row[col_map['WEIGHT BREAK']]),
+                )
+            except ValueError:
+                continue
+
+        return cls(bands["miles"].astype(float).tolist(), [str(z) for z in bands["zone"]], rates)
+
+    def zone_for_miles(self, miles: float) -> str:
+        """Zone of the first band whose MILES threshold is >= miles; X past the last band."""
+        i = bisect_left(self.thresholds, miles)
+        if miles != miles or i == len(self.thresholds):  # NaN never matches a band
+            return "X"
+        return self.zones[i]
 
-    # Convert the miles column to a numeric type
-    rates_df[col_map['MILES']] = pd.to_numeric(rates_df[col_map['MILES']], errors='coerce')
+    def zone_rates(self, zone: str) -> ZoneRates:
+        try:
+            return self.rates[zone]
+        except KeyError:
+            raise KeyError(f"Zone '{zone}' has no rates in the Hotshot Rates sheet.") from None
 
-    for _, row in rates_df[[col_map['MILES'], col_map['ZONE']]].dropna().sort_values(col_map['MILES']).iterrows():
-        if miles <= float(row[col_map['MILES']]):
-            zone = row[col_map['ZONE']]
-            break
 
+def _price_hotshot(table: HotshotRateTable, miles: float, weight, accessorial_total) -> dict:
+    zone = table.zone_for_miles(miles)
     is_zone_x = zone.upper() == "X"
-    
-    # Use the mapped column names to access data
-    per_lb = float(rates_df.loc[rates_df[col_map['ZONE']].astype(str) == zone, col_map['PER LB']].values[0])
-    fuel_pct = float(rates_df.loc[rates_df[col_map['ZONE']].astype(str) == zone, col_map['FUEL']].values[0])
-    min_charge = float(rates_df.loc[rates_df[col_map['ZONE']].astype(str) == zone, col_map['MIN']].values[0])
-    weight_break = float(rates_df.loc[rates_df[col_map['ZONE']].astype(str) == zone, col_map['WEIGHT BREAK']].values[0])
+
+    rates = table.zone_rates(zone)
+    per_lb = rates.per_lb
+    fuel_pct = rates.fuel
+    min_charge = rates.min_charge
+    weight_break = rates.weight_break
 
     if is_zone_x:
-        rate_per_mile = float(rates_df.loc[rates_df[col_map['ZONE']].astype(str) == zone, col_map['MIN']].values[0])
+        rate_per_mile = rates.min_charge
         miles_charge = miles * rate_per_mile * (1 + fuel_pct)
         subtotal = miles_charge + accessorial_total
     else:
@@ -54,4 +105,188 @@ def calculate_hotshot_quote(origin, destination, weight, accessorial_total, rate
         "weight_break": weight_break,
         "per_lb": per_lb,
         "min_charge": min_charge
-    }
\ No newline at end of file
+    }
+
+
+def _rate_table(rates_df) -> HotshotRateTable:
+    # A RateCard passes its compiled table; a raw "Hotshot Rates" sheet is compiled on the fly
+    return rates_df if isinstance(rates_df, HotshotRateTable) else HotshotRateTable.from_sheet(rates_df)
+
+
+# How often the centroid bounds settled the zone without a distance lookup
+_band_decisions = {"skipped": 0, "looked_up": 0}
+_band_lock = threading.Lock()
+
+
+def _count_band_decision(key: str):
+    with _band_lock:
+        _band_decisions[key] += 1
+
+
+def band_decision_counts() -> dict:
+    with _band_lock:
+        return dict(_band_decisions)
+
+
+def certain_zone(origin, destination, table: HotshotRateTable) -> tuple[str, float, float] | None:
+    """
+    (zone, lower, upper) when the lane's centroid mileage bounds fall in the same non-X
+    band even with the upper bound stretched by BOUND_MARGIN; None otherwise.
+    The upper bound assumes at most DISTANCE_MAX_CIRCUITY, which very circuitous lanes
+    (water crossings, mountains) can exceed: this is a strong heuristic, not a guarantee,
+    so check it with python -m quote.geo --check-bounds.
+    Zone X is priced per mile and always needs the exact distance.
+    """
+    bounds = mileage_bounds(origin, destination)
+    if bounds is None:
+        return None
+    lower, upper = bounds
+    zone = table.zone_for_miles(lower)
+    if zone.upper() == "X" or table.zone_for_miles(upper * BOUND_MARGIN) != zone:
+        return None
+    return zone, lower, upper
+
+
+def calculate_hotshot_quote(origin, destination, weight, accessorial_total, rates_df):
+    table = _rate_table(rates_df)
+
+    # Only the band matters below zone X: skip the Maps call when the bounds pin it down
+    certain = certain_zone(origin, destination, table)
+    if certain is not None:
+        zone, lower, upper = certain
+        _count_band_decision("skipped")
+        print(
+            f"[hotshot] {origin}->{destination}: distance lookup skipped, {lower:.1f}-{upper:.1f} mi "
+            f"(x{BOUND_MARGIN:g} margin) is all zone {zone}; band assumed from centroid bounds"
+        )
+        miles = min(max(estimate_miles(origin, destination), lower), upper)
+        result = _price_hotshot(table, miles, weight, accessorial_total)
+        # Flagged so saved quotes and the UI can tell a bounds-priced band from a looked-up one
+        result["distance_source"] = "bounds"
+        result["miles_bounds"] = (lower, upper)
+        result["provisional"] = False
+        return result
+    _count_band_decision("looked_up")
+    print(f"[hotshot] {origin}->{destination}: distance lookup needed, band not certain from bounds")
+
+    # No miles means no zone: fail loudly instead of pricing the lane at 0 miles
+    distance = lookup_distance(origin, destination)
+    if not distance.ok:
+        raise DistanceUnavailableError(origin, destination, distance)
+
+    result = _price_hotshot(table, distance.miles, weight, accessorial_total)
+    result["distance_source"] = distance.source
+    # ZIP3 miles are typical for the two areas, not this lane's exact route
+    result["provisional"] = distance.source == "zip3"
+    if result["provisional"]:
+        result["provisional_reason"] = (
+            "The mapping service was unavailable, so typical miles between these 3-digit ZIP areas were used."
+        )
+    return result
+
+
+def estimate_hotshot_quote(origin, destination, weight, accessorial_total, rates_df):
+    """
+    Instant provisional quote from ZIP centroids (straight-line miles x road circuity)
+    instead of a Maps lookup, for display while the exact distance is on its way.
+    Returns None when either ZIP has no centroid.
+    """
+    miles = estimate_miles(origin, destination)
+    if miles is None:
+        return None
+    result = _price_hotshot(_rate_table(rates_df), miles, weight, accessorial_total)
+    result["distance_source"] = "estimate"
+    result["provisional"] = True
+    return result
+
+
+def _zip5(value) -> str | None:
+    key = zip_key(value)
+    return None if key is None else f"{key:05d}"
+
+
+def calculate_hotshot_quotes_batch(df: pd.DataFrame, rates=None, resolve_distances=None) -> pd.DataFrame:
+    """
+    Price many Hotshot lanes at once.
+
+    df needs "origin", "destination" and "weight" columns; "accessorial_total" is optional.
+    Mileage is looked up once per distinct (origin, destination) pair through
+    resolve_distances(pairs) -> {pair: miles or None} (default: get_distances, which
+    serves cached lanes locally and batches the rest into Distance Matrix requests).
+    Returns a frame on df's index with the calculate_hotshot_quote fields plus "error";
+    lanes with a bad ZIP or no distance and rows without a positive weight get NaN amounts
+    and a message instead of being priced at 0 miles, and never abort the rest of the batch.
+    """
+    if rates is None:
+        try:
+            from quote.rate_card import get_rate_card
+        except ImportError:
+            from rate_card import get_rate_card
+        rates = get_rate_card().hotshot_rates
+    table = rates if isinstance(rates, HotshotRateTable) else HotshotRateTable.from_sheet(rates)
+    resolve_distances = resolve_distances or get_distances
+
+    n = len(df)
+    weight = pd.to_numeric(df["weight"], errors="coerce").to_numpy(dtype=float)
+    if "accessorial_total" in df.columns:
+        accessorial_total = pd.to_numeric(df["accessorial_total"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    else:
+        accessorial_total = np.zeros(n)
+    error = np.full(n, None, dtype=object)
+
+    # Distinct lanes -> one distance lookup each
+    origins = [_zip5(v) for v in df["origin"]]
+    destinations = [_zip5(v) for v in df["destination"]]
+    lanes = pd.Series(list(zip(origins, destinations)), dtype=object)
+    codes, uniques = pd.factorize(lanes)
+    good = [(o, d) for o, d in uniques if o and d]
+    found = resolve_distances(good) if good else {}
+    lane_miles = np.array([
+        np.nan if found.get((o, d)) is None else float(found[(o, d)]) for o, d in uniques
+    ], dtype=float)
+    miles = lane_miles[codes]
+
+    for i in np.flatnonzero(np.isnan(miles)):
+        if not origins[i] or not destinations[i]:
+            error[i] = f"Bad ZIP code(s): origin={df['origin'].iat[i]!r}, destination={df['destination'].iat[i]!r}"
+        else:
+            error[i] = f"Distance unavailable for {origins[i]} -> {destinations[i]}"
+
+    # Band index per lane; the slot past the last threshold is zone X
+    band_zones = list(table.zones) + ["X"]
+    band = np.searchsorted(np.asarray(table.thresholds, dtype=float), miles, side="left")
+    band = np.where(np.isnan(miles), len(table.thresholds), band)
+
+    def per_band(attr):
+        return np.array([getattr(table.rates[z], attr) if z in table.rates else np.nan for z in band_zones])
+
+    per_lb = per_band("per_lb")[band]
+    fuel_pct = per_band("fuel")[band]
+    min_charge = per_band("min_charge")[band]
+    weight_break = per_band("weight_break")[band]
+    zone = np.array(band_zones, dtype=object)[band]
+    is_zone_x = np.array([z.upper() == "X" for z in band_zones])[band]
+
+    missing_rates = np.array([z not in table.rates for z in band_zones])[band] & ~np.isnan(miles)
+    for i in np.flatnonzero(missing_rates):
+        error[i] = f"Zone '{zone[i]}' has no rates in the Hotshot Rates sheet."
+
+    raw_weights = df["weight"].to_numpy(dtype=object)
+    for i in np.flatnonzero(~(weight > 0)):
+        if error[i] is None:
+            error[i] = f"Invalid weight {raw_weights[i]!r}: expected a positive number of lbs"
+
+    miles_total = miles * min_charge * (1 + fuel_pct) + accessorial_total
+    weight_total = np.maximum(min_charge, weight * per_lb) * (1 + fuel_pct) + accessorial_total
+    quote_total = np.where(is_zone_x, miles_total, weight_total)
+
+    failed = np.array([e is not None for e in error], dtype=bool)
+    return pd.DataFrame({
+        "zone": np.where(failed, None, zone),
+        "miles": miles,
+        "quote_total": np.where(failed, np.nan, quote_total),
+        "weight_break": np.where(failed, np.nan, weight_break),
+        "per_lb": np.where(failed, np.nan, per_lb),
+        "min_charge": np.where(failed, np.nan, min_charge),
+        "error": error,
+    }, index=df.index)
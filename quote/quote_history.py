@@ -0,0 +1,198 @@
+# File: quote_history.py
+"""
+Queries over saved quotes for the admin dashboard: filtering, keyset pages and
+streaming exports.
+
+Filters run in SQL and pages are fetched by keyset on (created_at, id), newest
+first: every page is one index range scan however deep the admin pages. Only
+the displayed columns are selected, read straight into DataFrames, never as
+ORM objects.
+
+Exports read the same filtered query in chunks (yield_per, i.e. a server-side
+cursor where the driver has one) and write each chunk out before fetching the
+next, so memory use while writing stays flat however many quotes match. (The admin
+page's download button then holds the finished file in memory; the CLI doesn't.)
+
+    python -m quote.quote_history csv quotes.csv --start 2025-01-01 --type Air
+    python -m quote.quote_history parquet - > quotes.parquet
+"""
+import argparse
+import sys
+from datetime import date, datetime, time, timedelta
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import and_, func, or_, select
+
+from db import Quote, engine
+
+PAGE_SIZE = 100
+COUNT_CAP = 10000
+EXPORT_CHUNK_ROWS = 5000
+QUOTE_TYPES = ["Hotshot", "Air"]
+EXCEL_MAX_ROWS = 1_048_576
+
+# (column, header, Arrow type) in display order
+COLUMNS = [
+    (Quote.quote_id, "Quote ID", pa.string()),
+    (Quote.user_id, "User ID", pa.int64()),
+    (Quote.user_email, "User Email", pa.string()),
+    (Quote.quote_type, "Type", pa.string()),
+    (Quote.origin, "Origin", pa.string()),
+    (Quote.destination, "Destination", pa.string()),
+    (Quote.weight, "Weight", pa.float64()),
+    (Quote.weight_method, "Method", pa.string()),
+    (Quote.zone, "Zone", pa.string()),
+    (Quote.total, "Total", pa.float64()),
+    (Quote.quote_metadata, "Accessorials", pa.string()),
+    (Quote.created_at, "Date", pa.timestamp("us")),
+]
+HEADERS = [header for _, header, _ in COLUMNS]
+ARROW_SCHEMA = pa.schema([(header, arrow_type) for _, header, arrow_type in COLUMNS])
+
+# label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def _prefix(column, text: str):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.like(f"{escaped}%", escape="\\")
+
+
+def quote_conditions(filters: dict) -> list:
+    """
+    WHERE clauses for the admin filters. Keys (all optional): start / end (dates,
+    inclusive), types, email / origin / destination (prefix match), min_total / max_total.
+    """
+    conds = []
+    if filters.get("start"):
+        conds.append(Quote.created_at >= datetime.combine(filters["start"], time.min))
+    if filters.get("end"):
+        conds.append(Quote.created_at < datetime.combine(filters["end"] + timedelta(days=1), time.min))
+    if filters.get("types"):
+        conds.append(Quote.quote_type.in_(filters["types"]))
+    for key, column in (("email", Quote.user_email), ("origin", Quote.origin), ("destination", Quote.destination)):
+        if filters.get(key):
+            conds.append(_prefix(column, filters[key]))
+    if filters.get("min_total") is not None:
+        conds.append(Quote.total >= filters["min_total"])
+    if filters.get("max_total") is not None:
+        conds.append(Quote.total <= filters["max_total"])
+    return conds
+
+
+def _select(filters: dict):
+    stmt = select(*(column.label(header) for column, header, _ in COLUMNS)).where(*quote_conditions(filters))
+    return stmt.order_by(Quote.created_at.desc(), Quote.id.desc())
+
+
+def fetch_quotes_page(filters: dict, after: tuple | None = None, page_size: int = PAGE_SIZE) -> tuple[pd.DataFrame, tuple | None]:
+    """
+    One page of matching quotes, newest first, starting after the (created_at, id)
+    cursor. Returns (page, cursor for the next page or None on the last page).
+    """
+    stmt = _select(filters).add_columns(Quote.id.label("_id"))
+    if after is not None:
+        created_at, quote_pk = after
+        stmt = stmt.where(or_(Quote.created_at < created_at, and_(Quote.created_at == created_at, Quote.id < quote_pk)))
+    with engine.connect() as conn:
+        df = pd.read_sql(stmt.limit(page_size + 1), conn)
+
+    cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        cursor = (df["Date"].iloc[-1].to_pydatetime(), int(df["_id"].iloc[-1]))
+    return df.drop(columns="_id"), cursor
+
+
+def count_quotes(filters: dict, cap: int | None = COUNT_CAP) -> int:
+    """
+    Number of matching quotes, counting no further than cap + 1 (so a result above cap
+    means "more than cap") to keep the cost bounded; cap=None counts them all.
+    """
+    matching = select(Quote.id).where(*quote_conditions(filters))
+    if cap is not None:
+        matching = matching.limit(cap + 1)
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(matching.subquery())).scalar_one()
+
+
+def iter_quote_chunks(filters: dict, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Every matching quote, newest first, as DataFrames of up to chunk_rows rows."""
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_rows).execute(_select(filters))
+        for rows in result.partitions():
+            yield pd.DataFrame.from_records(rows, columns=HEADERS)
+
+
+def write_export(filters: dict, fmt: str, out, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """
+    Stream the matching quotes to out (a path or binary file object) as "CSV", "Excel"
+    or "Parquet", one chunk at a time. Returns the number of rows written.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} (expected one of {', '.join(EXPORT_FORMATS)})")
+    chunks = iter_quote_chunks(filters, chunk_rows)
+    rows = 0
+
+    if fmt == "CSV":
+        f = open(out, "wb") if isinstance(out, str) else out
+        try:
+            f.write((",".join(HEADERS) + "\n").encode())
+            for chunk in chunks:
+                f.write(chunk.to_csv(index=False, header=False, date_format="%Y-%m-%d %H:%M:%S").encode())
+                rows += len(chunk)
+        finally:
+            if isinstance(out, str):
+                f.close()
+
+    elif fmt == "Parquet":
+        with pq.ParquetWriter(out, ARROW_SCHEMA) as writer:
+            for chunk in chunks:
+                # One row group per chunk; the fixed schema keeps all-null chunks consistent
+                writer.write_table(pa.Table.from_pandas(chunk, schema=ARROW_SCHEMA, preserve_index=False))
+                rows += len(chunk)
+
+    else:
+        from openpyxl import Workbook
+        # write_only streams rows to a temp file instead of holding the sheet in memory
+        wb = Workbook(write_only=True)
+        ws, sheet_rows = None, 0
+        for chunk in chunks:
+            for record in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+                if ws is None or sheet_rows >= EXCEL_MAX_ROWS:  # a sheet holds ~1M rows; continue on the next
+                    ws = wb.create_sheet(f"Quotes {len(wb.worksheets) + 1}" if ws else "Quotes")
+                    ws.append(HEADERS)
+                    sheet_rows = 1
+                ws.append(list(record))
+                sheet_rows += 1
+            rows += len(chunk)
+        if ws is None:
+            wb.create_sheet("Quotes").append(HEADERS)
+        wb.save(out)
+    return rows
+
+
+if __name__ == "__main__":
+    formats = {ext: label for label, (ext, _) in EXPORT_FORMATS.items()}
+    parser = argparse.ArgumentParser(description="Export saved quotes (newest first) with the admin filters.")
+    parser.add_argument("format", choices=sorted(formats))
+    parser.add_argument("out", help="output file, or - for stdout (CSV/Parquet)")
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    parser.add_argument("--type", action="append", dest="types", choices=QUOTE_TYPES)
+    parser.add_argument("--email", help="user email prefix")
+    parser.add_argument("--origin", help="origin ZIP prefix")
+    parser.add_argument("--destination", help="destination ZIP prefix")
+    parser.add_argument("--min-total", type=float)
+    parser.add_argument("--max-total", type=float)
+    args = vars(parser.parse_args())
+    fmt, out = formats[args.pop("format")], args.pop("out")
+    n = write_export(args, fmt, sys.stdout.buffer if out == "-" else out)
+    print(f"{n:,} quotes exported", file=sys.stderr)
@@ -0,0 +1,250 @@
+# File: rate_card.py
+"""
+Compiled snapshots of the rate workbook.
+
+Parsing "HotShot Quote.xlsx" with openpyxl takes seconds, so the workbook is
+compiled once into a directory of Parquet files keyed by the workbook's
+content hash. Later loads memory-map the Parquet files instead of re-parsing
+the Excel file, and a new snapshot is built only when the workbook changes.
+
+get_rate_card() hands every Streamlit session the same read-only RateCard.
+The workbook's mtime is polled at most every RATE_CARD_POLL_SECONDS; when the
+content hash changes a new RateCard is loaded and swapped in atomically.
+Callers grab the card once per rerun, so a quote in flight keeps pricing
+against the version it started with.
+
+    python -m quote.rate_card            # pre-build the snapshot (e.g. on deploy)
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Mapping
+from datetime import datetime
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+try:
+    from quote.utils import AccessorialTable, ReadOnly, find_columns, normalize_workbook
+    from quote.zip_index import ZipZoneIndex
+    from quote.logic_air import AirRateTable
+    from quote.logic_hotshot import HotshotRateTable
+except ImportError:
+    from utils import AccessorialTable, ReadOnly, find_columns, normalize_workbook
+    from zip_index import ZipZoneIndex
+    from logic_air import AirRateTable
+    from logic_hotshot import HotshotRateTable
+
+WORKBOOK_PATH = "HotShot Quote.xlsx"
+CACHE_DIR = os.getenv("RATE_CARD_CACHE_DIR", ".rate_card_cache")
+POLL_SECONDS = float(os.getenv("RATE_CARD_POLL_SECONDS", "5"))
+MANIFEST = "manifest.json"
+
+# (abs path, mtime_ns, size) -> sha256, so unchanged files aren't re-hashed on every rerun
+_hash_memo: dict[tuple, str] = {}
+
+
+def workbook_hash(path: str = WORKBOOK_PATH) -> str:
+    """SHA-256 of the workbook bytes (memoized on mtime/size)."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    digest = _hash_memo.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        _hash_memo[key] = digest
+    return digest
+
+
+def _snapshot_dir(digest: str, cache_dir: str | None = None) -> str:
+    return os.path.join(cache_dir or CACHE_DIR, digest)
+
+
+def _to_arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Excel gives object columns mixing str and int (e.g. a stray 'h' in Miles); store those as text."""
+    df = df.copy()
+    for c in df.columns:
+        if df[c].dtype != object:
+            continue
+        kinds = {type(v) for v in df[c] if not (isinstance(v, float) and np.isnan(v))}
+        if len(kinds) > 1:
+            df[c] = df[c].map(lambda v: v if isinstance(v, float) and np.isnan(v) else str(v))
+    return df
+
+
+def _from_arrow(df: pd.DataFrame) -> pd.DataFrame:
+    """Parquet returns None for missing text; the pricing code expects NaN like read_excel gives."""
+    for c in df.columns:
+        if df[c].dtype == object:
+            df[c] = df[c].where(df[c].notna(), np.nan)
+    return df
+
+
+def compile_workbook(path: str = WORKBOOK_PATH, cache_dir: str | None = None) -> str:
+    """Build the Parquet snapshot for the workbook if it doesn't exist yet; return its directory."""
+    digest = workbook_hash(path)
+    target = _snapshot_dir(digest, cache_dir)
+    if os.path.exists(os.path.join(target, MANIFEST)):
+        return target
+
+    workbook = normalize_workbook(pd.read_excel(path, sheet_name=None))
+
+    parent = os.path.dirname(target)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{digest[:12]}-", dir=parent)
+    try:
+        sheets = []
+        for i, (name, df) in enumerate(workbook.items()):
+            fname = f"sheet_{i:02d}.parquet"
+            _to_arrow_safe(df).to_parquet(os.path.join(tmp, fname), index=False)
+            sheets.append({"name": name, "file": fname})
+        with open(os.path.join(tmp, MANIFEST), "w") as f:
+            json.dump({"sha256": digest, "source": os.path.basename(path), "sheets": sheets}, f, indent=2)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another process published the same snapshot first
+            shutil.rmtree(tmp, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return target
+
+
+def load_workbook(path: str = WORKBOOK_PATH, cache_dir: str | None = None) -> dict[str, pd.DataFrame]:
+    """
+    Return {sheet name: DataFrame} with normalized headers, same shape as
+    normalize_workbook(pd.read_excel(path, sheet_name=None)), served from the snapshot.
+    """
+    target = compile_workbook(path, cache_dir)
+    with open(os.path.join(target, MANIFEST)) as f:
+        manifest = json.load(f)
+    return {
+        s["name"]: _from_arrow(pd.read_parquet(os.path.join(target, s["file"]), memory_map=True))
+        for s in manifest["sheets"]
+    }
+
+
+def resolve_headers(sheets) -> dict[str, dict]:
+    """Resolve every header the pricing code uses, for all sheets at once; one error lists everything missing."""
+    specs = {
+        ZipZoneIndex.SHEET: ZipZoneIndex.COLUMNS,
+        **AirRateTable.COLUMNS,
+        HotshotRateTable.SHEET: HotshotRateTable.COLUMNS,
+        "Accessorials": {},  # headers are the accessorial names
+    }
+    resolved, problems = {}, []
+    for sheet, wanted in specs.items():
+        if sheet not in sheets:
+            problems.append(f"Missing sheet '{sheet}'.")
+            continue
+        try:
+            resolved[sheet] = find_columns(sheets[sheet], wanted, sheet)
+        except KeyError as e:
+            problems.append(e.args[0])
+    if problems:
+        raise KeyError("Rate workbook failed validation: " + " ".join(problems))
+    return resolved
+
+
+class RateCard(ReadOnly, Mapping):
+    """
+    One immutable, compiled version of the workbook, safe to read from any number of
+    session threads without copies or locks. Headers are resolved and validated and
+    currency cells parsed once, when the card is built; pricing reads the compiled
+    zip_index / air_rates / hotshot_rates / accessorials tables. It also behaves like the
+    {sheet: DataFrame} dict for code that still wants a raw sheet (never mutate those).
+    """
+
+    __slots__ = ("version", "source", "loaded_at", "columns", "_sheets", "zip_index", "air_rates", "hotshot_rates", "accessorials")
+
+    def __init__(self, sheets: dict[str, pd.DataFrame], version: str, source: str):
+        columns = resolve_headers(sheets)
+        zip_index = ZipZoneIndex.from_sheet(sheets[ZipZoneIndex.SHEET], columns[ZipZoneIndex.SHEET])
+        air_cols = {k: v for sheet in AirRateTable.COLUMNS for k, v in columns[sheet].items()}
+        self._init(
+            version=version,
+            source=source,
+            loaded_at=datetime.now(),
+            columns=MappingProxyType(columns),
+            _sheets=MappingProxyType(dict(sheets)),
+            zip_index=zip_index,
+            air_rates=AirRateTable.from_workbook(sheets, zip_index, air_cols),
+            hotshot_rates=HotshotRateTable.from_sheet(sheets[HotshotRateTable.SHEET], columns[HotshotRateTable.SHEET]),
+            accessorials=AccessorialTable.from_sheet(sheets["Accessorials"]),
+        )
+
+    def __getitem__(self, name):
+        return self._sheets[name]
+
+    def __iter__(self):
+        return iter(self._sheets)
+
+    def __len__(self):
+        return len(self._sheets)
+
+    def __repr__(self):
+        return f"RateCard(version={self.version[:12]!r}, source={self.source!r})"
+
+
+# abs path -> (RateCard, monotonic time of the last mtime check, (mtime_ns, size) last seen)
+_cards: dict[str, tuple[RateCard, float, tuple]] = {}
+_cards_lock = threading.Lock()
+
+
+def _stamp(path: str) -> tuple:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_rate_card(path: str = WORKBOOK_PATH) -> RateCard:
+    """Return the process-wide RateCard for path, reloading it if the workbook changed on disk."""
+    key = os.path.abspath(path)
+    entry = _cards.get(key)
+    if entry is not None and time.monotonic() - entry[1] < POLL_SECONDS:
+        return entry[0]
+
+    if entry is not None:
+        # Someone else is already reloading: keep serving the current version meanwhile
+        if not _cards_lock.acquire(blocking=False):
+            return entry[0]
+    else:
+        _cards_lock.acquire()
+    try:
+        entry = _cards.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[1] < POLL_SECONDS:
+            return entry[0]
+        card, stamp = (entry[0], entry[2]) if entry else (None, ())
+        try:
+            new_stamp = _stamp(path)
+            if card is None or new_stamp != stamp:
+                digest = workbook_hash(path)
+                if card is None or digest != card.version:
+                    # Build the new version fully before publishing it
+                    card = RateCard(load_workbook(path), digest, os.path.basename(path))
+                    print(f"[rate_card] loaded {card.source} version {digest[:12]}")
+                stamp = new_stamp
+        except Exception as e:
+            if card is None:
+                raise
+            # e.g. the workbook is mid-save; keep serving the last good version
+            print(f"[rate_card] reload failed, keeping {card.version[:12]}: {e}")
+        _cards[key] = (card, now, stamp)
+        return card
+    finally:
+        _cards_lock.release()
+
+
+if __name__ == "__main__":
+    src = sys.argv[1] if len(sys.argv) > 1 else WORKBOOK_PATH
+    print(compile_workbook(src))
@@ -0,0 +1,421 @@
+# File: road_graph.py
+"""
+Local road-network distance provider.
+
+Driving miles are computed from a road graph on disk instead of the Google
+Maps API, for on-prem deployments with no per-quote API cost or latency.
+
+The graph is preprocessed once into a contraction hierarchy (CH): nodes are
+ranked, and shortcut edges are added so that a shortest path always goes
+"up" the ranking from both ends. A query is then a small bidirectional
+Dijkstra over upward edges only, which settles a few hundred nodes instead of
+a whole region. Every ZIP centroid is snapped to its nearest road node at
+build time, so a lookup is (snap miles) + CH distance + (snap miles).
+
+Input is a road extract already reduced to two CSVs (e.g. from an OSM extract
+with osmnx or osmium): nodes.csv with id, lat, lon and edges.csv with u, v,
+miles and an optional oneway flag (0/1; two-way roads by default).
+
+    python -m quote.road_graph build nodes.csv edges.csv [road_graph.npz]
+    python -m quote.road_graph compare [distance_cache.db]     # accuracy vs cached Google miles
+
+Select it with DISTANCE_PROVIDER=roadgraph (index path: ROAD_GRAPH_PATH).
+"""
+import heapq
+import os
+import sqlite3
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    from quote.distance import DistanceProvider, DistanceResult
+    from quote.distance_cache import CACHE_PATH
+    from quote.geo import get_centroids, haversine_miles
+    from quote.utils import ReadOnly
+    from quote.zip_index import SLOTS, zip_key
+except ImportError:
+    from distance import DistanceProvider, DistanceResult
+    from distance_cache import CACHE_PATH
+    from geo import get_centroids, haversine_miles
+    from utils import ReadOnly
+    from zip_index import SLOTS, zip_key
+
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", "road_graph.npz")
+ROAD_GRAPH_WORKERS = int(os.getenv("ROAD_GRAPH_WORKERS", "0"))
+# A ZIP centroid farther than this from any road node is left unsnapped
+MAX_SNAP_MILES = 25.0
+# Witness searches give up after settling this many nodes (then the shortcut is simply kept)
+WITNESS_SETTLE_LIMIT = 300
+
+_INF = float("inf")
+
+
+# ---------- Preprocessing ----------
+
+def contract(n: int, tails, heads, weights, settle_limit: int = WITNESS_SETTLE_LIMIT):
+    """
+    Build a contraction hierarchy over a directed graph with n nodes.
+    Returns (rank, up_forward, up_backward): up_forward[v] lists (w, miles) for edges
+    v -> w with rank[w] > rank[v]; up_backward[v] lists (u, miles) for edges u -> v
+    with rank[u] > rank[v]. Shortcuts are included in both.
+    """
+    out = [dict() for _ in range(n)]
+    inc = [dict() for _ in range(n)]
+    for u, v, w in zip(tails, heads, weights):
+        if u != v and w < out[u].get(v, _INF):
+            out[u][v] = w
+            inc[v][u] = w
+
+    def witness_distances(source, targets, skip, max_cost):
+        # Dijkstra over the not-yet-contracted graph, avoiding the node being contracted
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        remaining = set(targets)
+        settled = 0
+        while heap and remaining:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            if d > max_cost or settled >= settle_limit:
+                break
+            settled += 1
+            remaining.discard(x)
+            for y, w in out[x].items():
+                nd = d + w
+                if y != skip and nd < dist.get(y, _INF):
+                    dist[y] = nd
+                    heapq.heappush(heap, (nd, y))
+        return dist
+
+    def needed_shortcuts(v):
+        shortcuts = []
+        outs = out[v]
+        if not outs:
+            return shortcuts
+        max_out = max(outs.values())
+        for u, wu in inc[v].items():
+            targets = [x for x in outs if x != u]
+            if not targets:
+                continue
+            dist = witness_distances(u, targets, v, wu + max_out)
+            for x in targets:
+                via = wu + outs[x]
+                if dist.get(x, _INF) > via:
+                    shortcuts.append((u, x, via))
+        return shortcuts
+
+    deleted_neighbors = [0] * n
+
+    def priority(v):
+        # Edge difference plus a uniformity term, re-evaluated lazily
+        shortcuts = needed_shortcuts(v)
+        return len(shortcuts) - len(inc[v]) - len(out[v]) + deleted_neighbors[v], shortcuts
+
+    rank = np.full(n, -1, dtype=np.int64)
+    up_forward = [None] * n
+    up_backward = [None] * n
+    heap = [(priority(v)[0], v) for v in range(n)]
+    heapq.heapify(heap)
+    order = 0
+    while heap:
+        _, v = heapq.heappop(heap)
+        if rank[v] >= 0:
+            continue
+        p, shortcuts = priority(v)
+        if heap and p > heap[0][0]:
+            heapq.heappush(heap, (p, v))
+            continue
+
+        rank[v] = order
+        order += 1
+        up_forward[v] = list(out[v].items())
+        up_backward[v] = list(inc[v].items())
+        for x in out[v]:
+            del inc[x][v]
+            deleted_neighbors[x] += 1
+        for u in inc[v]:
+            del out[u][v]
+            deleted_neighbors[u] += 1
+        out[v], inc[v] = {}, {}
+        for u, x, w in shortcuts:
+            if w < out[u].get(x, _INF):
+                out[u][x] = w
+                inc[x][u] = w
+    return rank, up_forward, up_backward
+
+
+def _csr(adjacency) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    indptr = np.zeros(len(adjacency) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(a) for a in adjacency])
+    heads = np.fromiter((x for a in adjacency for x, _ in a), dtype=np.int32, count=int(indptr[-1]))
+    weights = np.fromiter((w for a in adjacency for _, w in a), dtype=np.float64, count=int(indptr[-1]))
+    return indptr, heads, weights
+
+
+def snap_zips(node_lat: np.ndarray, node_lon: np.ndarray, cell_degrees: float = 0.25):
+    """Nearest road node for every ZIP centroid: (zip_node int32[SLOTS], zip_snap_miles float32[SLOTS])."""
+    centroids = get_centroids()
+    zip_node = np.full(SLOTS, -1, dtype=np.int32)
+    zip_snap = np.full(SLOTS, np.nan, dtype=np.float32)
+
+    cells: dict[tuple, list] = {}
+    for i, key in enumerate(zip((node_lat // cell_degrees).astype(int), (node_lon // cell_degrees).astype(int))):
+        cells.setdefault(key, []).append(i)
+    cells = {k: np.array(v) for k, v in cells.items()}
+    max_ring = int(MAX_SNAP_MILES / 69.0 / cell_degrees) + 2
+
+    for z in np.flatnonzero(~np.isnan(centroids.lat)):
+        lat, lon = float(centroids.lat[z]), float(centroids.lon[z])
+        ci, cj = int(lat // cell_degrees), int(lon // cell_degrees)
+        found = []
+        for ring in range(max_ring + 1):
+            for di in range(-ring, ring + 1):
+                for dj in range(-ring, ring + 1):
+                    if max(abs(di), abs(dj)) == ring and (ci + di, cj + dj) in cells:
+                        found.append(cells[(ci + di, cj + dj)])
+            if found and ring >= 1:  # one extra ring so a closer node across a cell edge isn't missed
+                break
+        if not found:
+            continue
+        candidates = np.concatenate(found)
+        miles = haversine_miles(lat, lon, node_lat[candidates], node_lon[candidates])
+        best = int(np.argmin(miles))
+        if miles[best] <= MAX_SNAP_MILES:
+            zip_node[z] = candidates[best]
+            zip_snap[z] = miles[best]
+    return zip_node, zip_snap
+
+
+def build_index(nodes_csv: str, edges_csv: str, out_path: str = ROAD_GRAPH_PATH) -> str:
+    """Contract the road graph and write the query index (.npz) atomically; returns out_path."""
+    nodes = pd.read_csv(nodes_csv)
+    edges = pd.read_csv(edges_csv)
+    index_of = pd.Series(np.arange(len(nodes)), index=nodes["id"])
+    tails = index_of.loc[edges["u"]].to_numpy()
+    heads = index_of.loc[edges["v"]].to_numpy()
+    miles = edges["miles"].to_numpy(dtype=float)
+    oneway = edges["oneway"].fillna(0).astype(bool).to_numpy() if "oneway" in edges else np.zeros(len(edges), bool)
+    # Two-way roads become a pair of directed edges
+    tails, heads, miles = (
+        np.concatenate([tails, heads[~oneway]]),
+        np.concatenate([heads, tails[~oneway]]),
+        np.concatenate([miles, miles[~oneway]]),
+    )
+
+    rank, up_forward, up_backward = contract(len(nodes), tails.tolist(), heads.tolist(), miles.tolist())
+    node_lat = nodes["lat"].to_numpy(dtype=float)
+    node_lon = nodes["lon"].to_numpy(dtype=float)
+    zip_node, zip_snap = snap_zips(node_lat, node_lon)
+    fwd = _csr(up_forward)
+    bwd = _csr(up_backward)
+
+    folder = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp = tempfile.mkstemp(prefix=".road-graph-", suffix=".npz", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                rank=rank.astype(np.int32),
+                fwd_indptr=fwd[0], fwd_heads=fwd[1], fwd_miles=fwd[2],
+                bwd_indptr=bwd[0], bwd_heads=bwd[1], bwd_miles=bwd[2],
+                zip_node=zip_node, zip_snap=zip_snap,
+            )
+        os.replace(tmp, out_path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+    return out_path
+
+
+# ---------- Queries ----------
+
+class RoadGraph(ReadOnly):
+    """A loaded CH index. Adjacency is kept as Python lists: the query loop is pure heapq."""
+
+    __slots__ = ("fwd", "bwd", "zip_node", "zip_snap", "nodes")
+
+    def __init__(self, arrays):
+        def adjacency(prefix):
+            indptr = arrays[f"{prefix}_indptr"].tolist()
+            heads = arrays[f"{prefix}_heads"].tolist()
+            miles = arrays[f"{prefix}_miles"].tolist()
+            return [list(zip(heads[a:b], miles[a:b])) for a, b in zip(indptr, indptr[1:])]
+
+        self._init(
+            fwd=adjacency("fwd"),
+            bwd=adjacency("bwd"),
+            zip_node=arrays["zip_node"],
+            zip_snap=arrays["zip_snap"],
+            nodes=len(arrays["rank"]),
+        )
+
+    @classmethod
+    def load(cls, path: str = ROAD_GRAPH_PATH) -> "RoadGraph":
+        with np.load(path) as arrays:
+            return cls({k: arrays[k] for k in arrays.files})
+
+    def _upward_space(self, adjacency, source) -> dict:
+        """Every node reachable upward from source with its distance (one side of a one-to-many query)."""
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            for y, w in adjacency[x]:
+                nd = d + w
+                if nd < dist.get(y, _INF):
+                    dist[y] = nd
+                    heapq.heappush(heap, (nd, y))
+        return dist
+
+    def node_distance(self, s: int, t: int, forward_space: dict | None = None) -> float:
+        """Shortest s -> t miles (inf if unreachable). Pass forward_space to reuse s's upward search."""
+        if s == t:
+            return 0.0
+        df = forward_space if forward_space is not None else {s: 0.0}
+        db = {t: 0.0}
+        hf = [] if forward_space is not None else [(0.0, s)]
+        hb = [(0.0, t)]
+        best = df.get(t, _INF)
+        while True:
+            f_open = hf and hf[0][0] < best
+            b_open = hb and hb[0][0] < best
+            if not (f_open or b_open):
+                return best
+            if f_open:
+                d, x = heapq.heappop(hf)
+                if d <= df[x]:
+                    best = min(best, d + db.get(x, _INF))
+                    for y, w in self.fwd[x]:
+                        nd = d + w
+                        if nd < df.get(y, _INF):
+                            df[y] = nd
+                            heapq.heappush(hf, (nd, y))
+            if b_open:
+                d, x = heapq.heappop(hb)
+                if d <= db[x]:
+                    best = min(best, d + df.get(x, _INF))
+                    for y, w in self.bwd[x]:
+                        nd = d + w
+                        if nd < db.get(y, _INF):
+                            db[y] = nd
+                            heapq.heappush(hb, (nd, y))
+
+    def _snapped(self, zipcode) -> tuple[int, float] | None:
+        slot = zip_key(zipcode)
+        if slot is None or self.zip_node[slot] < 0:
+            return None
+        return int(self.zip_node[slot]), float(self.zip_snap[slot])
+
+    def zip_miles(self, origin, destination) -> float | None:
+        """Driving miles between two ZIPs (snap legs included); None if unsnapped or unreachable."""
+        o, d = self._snapped(origin), self._snapped(destination)
+        if o is None or d is None:
+            return None
+        if o[0] == d[0]:
+            return o[1] + d[1]
+        miles = self.node_distance(o[0], d[0])
+        return None if miles == _INF else miles + o[1] + d[1]
+
+    def one_to_many(self, origin, destinations) -> dict:
+        """{destination: miles or None} from one origin, sharing the origin's upward search."""
+        o = self._snapped(origin)
+        if o is None:
+            return {d: None for d in destinations}
+        space = self._upward_space(self.fwd, o[0])
+        out = {}
+        for dest in destinations:
+            d = self._snapped(dest)
+            if d is None:
+                out[dest] = None
+                continue
+            # node_distance extends the dict it is given; hand it a copy so searches stay independent
+            miles = 0.0 if o[0] == d[0] else self.node_distance(o[0], d[0], dict(space))
+            out[dest] = None if miles == _INF else miles + o[1] + d[1]
+        return out
+
+
+_graphs: dict[str, RoadGraph] = {}
+
+
+def get_road_graph(path: str = ROAD_GRAPH_PATH) -> RoadGraph:
+    graph = _graphs.get(path)
+    if graph is None:
+        graph = _graphs[path] = RoadGraph.load(path)
+    return graph
+
+
+def _one_to_many_job(args):
+    path, origin, destinations = args
+    return origin, get_road_graph(path).one_to_many(origin, destinations)
+
+
+class RoadGraphProvider(DistanceProvider):
+    """
+    Distance provider backed by the local CH index.
+    It neither reads nor fills the distance cache, which stays a record of Google
+    miles for accuracy comparisons.
+    """
+
+    name = "roadgraph"
+    cacheable = False
+
+    def __init__(self, path: str = ROAD_GRAPH_PATH, workers: int = ROAD_GRAPH_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.graph = get_road_graph(path)
+
+    def directions(self, o: str, d: str) -> DistanceResult:
+        if self.graph._snapped(o) is None or self.graph._snapped(d) is None:
+            return DistanceResult(None, "no_route", "ZIP is not near the road graph", self.name)
+        miles = self.graph.zip_miles(o, d)
+        if miles is None:
+            return DistanceResult(None, "no_route", "no path in the road graph", self.name)
+        return DistanceResult(miles, "ok", "", self.name)
+
+    def miles_many(self, pairs) -> dict:
+        """{(origin, destination): miles or None}; one upward search per origin, origins spread over worker processes."""
+        by_origin: dict = {}
+        for o, d in pairs:
+            by_origin.setdefault(o, []).append(d)
+        jobs = [(self.path, o, dests) for o, dests in by_origin.items()]
+        if self.workers and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(_one_to_many_job, jobs, chunksize=max(1, len(jobs) // (self.workers * 4))))
+        else:
+            results = [(o, self.graph.one_to_many(o, dests)) for _, o, dests in jobs]
+        return {(o, d): miles for o, found in results for d, miles in found.items()}
+
+
+def compare_with_cache(cache_path: str = CACHE_PATH, path: str = ROAD_GRAPH_PATH) -> dict:
+    """Road-graph miles vs the Google miles in the distance cache, as percentage-error statistics."""
+    with sqlite3.connect(cache_path) as conn:
+        df = pd.read_sql_query("SELECT origin, destination, miles FROM distances", conn)
+    provider = RoadGraphProvider(path)
+    found = provider.miles_many(list(zip(df["origin"], df["destination"])))
+    graph = np.array([np.nan if found.get(k) is None else found[k] for k in zip(df["origin"], df["destination"])])
+    google = df["miles"].to_numpy(dtype=float)
+    ok = ~np.isnan(graph) & (google > 0)
+    err = (graph[ok] - google[ok]) / google[ok] * 100
+    return {
+        "lanes": len(df),
+        "compared": int(ok.sum()),
+        "median_abs_pct_error": float(np.median(np.abs(err))) if ok.any() else float("nan"),
+        "p90_abs_pct_error": float(np.percentile(np.abs(err), 90)) if ok.any() else float("nan"),
+        "mean_pct_bias": float(err.mean()) if ok.any() else float("nan"),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        print(build_index(sys.argv[2], sys.argv[3], *(sys.argv[4:5] or [ROAD_GRAPH_PATH])))
+    elif len(sys.argv) >= 2 and sys.argv[1] == "compare":
+        print(compare_with_cache(*(sys.argv[2:3] or [CACHE_PATH])))
+    else:
+        print(__doc__)
+        sys.exit(2)
@@ -0,0 +1,235 @@
+# File: rollups.py
+"""
+Daily quote rollups: count, sum of totals and sum of weight per
+(UTC day, quote type, origin ZIP3, destination ZIP3) in quote_daily_rollups.
+
+The write-behind writer (quote.write_behind) adds every batch of new quotes to
+the rollups in the same transaction that inserts them, so the two can't drift
+apart. The admin summary reads only this table: its cost grows with days x
+lanes in the selected range, never with the number of quotes.
+
+Quotes written some other way (old scripts, manual SQL) aren't counted until
+a backfill, which rebuilds the table from the quotes table:
+
+    python -m quote.rollups backfill
+
+On SQLite the backfill reads without blocking quote saves. On a server database
+it holds off new quote inserts until it has swapped the table in (see backfill()).
+"""
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import delete, func, insert, inspect, select, text, update
+
+from db import Quote, QuoteRollup, engine
+
+try:
+    from quote.zip_index import zip_keys
+except ImportError:
+    from zip_index import zip_keys
+
+_KEY = ("day", "quote_type", "origin_zip3", "dest_zip3")
+_TABLE = QuoteRollup.__table__
+BACKFILL_CHUNK_ROWS = 20000
+# How long a missing rollup table is taken as still missing before checking again
+TABLE_RECHECK_SECONDS = 60
+
+
+def _zip3(values) -> list:
+    keys = zip_keys(values)
+    return [f"{k:05d}"[:3] if k >= 0 else "" for k in keys]
+
+
+def aggregate(quotes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rollup rows for a DataFrame of quotes (created_at, quote_type, origin,
+    destination, total, weight). Quotes without a created_at are skipped.
+    """
+    quotes = quotes[quotes["created_at"].notna()]
+    if quotes.empty:
+        return pd.DataFrame(columns=[*_KEY, "quote_count", "total_sum", "weight_sum"])
+    keyed = pd.DataFrame({
+        "day": pd.to_datetime(quotes["created_at"]).dt.date.to_numpy(),
+        "quote_type": quotes["quote_type"].fillna("").astype(str).to_numpy(),
+        "origin_zip3": _zip3(quotes["origin"]),
+        "dest_zip3": _zip3(quotes["destination"]),
+        "total": pd.to_numeric(quotes["total"], errors="coerce").fillna(0.0).to_numpy(),
+        "weight": pd.to_numeric(quotes["weight"], errors="coerce").fillna(0.0).to_numpy(),
+    })
+    return (
+        keyed.groupby(list(_KEY), sort=False)
+        .agg(quote_count=("total", "size"), total_sum=("total", "sum"), weight_sum=("weight", "sum"))
+        .reset_index()
+    )
+
+
+def _upsert(conn, rows: list[dict]):
+    """Add rows' counts and sums onto existing rollup rows, inserting the missing ones."""
+    if not rows:
+        return
+    dialect = (conn.get_bind() if hasattr(conn, "get_bind") else conn).dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(_TABLE)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(_KEY),
+            set_={
+                "quote_count": _TABLE.c.quote_count + stmt.excluded.quote_count,
+                "total_sum": _TABLE.c.total_sum + stmt.excluded.total_sum,
+                "weight_sum": _TABLE.c.weight_sum + stmt.excluded.weight_sum,
+            },
+        )
+        conn.execute(stmt, rows)
+        return
+    # Other databases: update, and insert where nothing matched
+    for row in rows:
+        key = [_TABLE.c[k] == row[k] for k in _KEY]
+        updated = conn.execute(
+            update(_TABLE).where(*key).values(
+                quote_count=_TABLE.c.quote_count + row["quote_count"],
+                total_sum=_TABLE.c.total_sum + row["total_sum"],
+                weight_sum=_TABLE.c.weight_sum + row["weight_sum"],
+            )
+        )
+        if updated.rowcount == 0:
+            conn.execute(insert(_TABLE), [row])
+
+
+def _records(rollup: pd.DataFrame) -> list[dict]:
+    return [
+        {**dict(zip(_KEY, key)), "quote_count": int(count), "total_sum": float(total), "weight_sum": float(weight)}
+        for *key, count, total, weight in rollup.itertuples(index=False)
+    ]
+
+
+_table_ready = False
+_table_checked_at = float("-inf")
+
+
+def _has_table(conn) -> bool:
+    """Whether the rollup table exists; a miss is remembered for TABLE_RECHECK_SECONDS."""
+    global _table_ready, _table_checked_at
+    if not _table_ready and time.monotonic() - _table_checked_at >= TABLE_RECHECK_SECONDS:
+        _table_checked_at = time.monotonic()
+        _table_ready = inspect(conn.get_bind() if hasattr(conn, "get_bind") else conn).has_table(_TABLE.name)
+        if not _table_ready:
+            print(f"[rollups] {_TABLE.name} is missing (run init_db, then python -m quote.rollups backfill); skipping")
+    return _table_ready
+
+
+def add_quotes(conn, quotes: list[dict]):
+    """
+    Add new quotes (column dicts, as saved) to the rollups inside the caller's transaction
+    (Session or Connection). Skipped while the table doesn't exist yet, so saving a
+    quote never depends on it; a backfill catches up later.
+    """
+    if quotes and _has_table(conn):
+        _upsert(conn, _records(aggregate(pd.DataFrame(quotes, columns=["created_at", "quote_type", "origin", "destination", "total", "weight"]))))
+
+
+_COLUMNS = [Quote.created_at, Quote.quote_type, Quote.origin, Quote.destination, Quote.total, Quote.weight]
+
+
+def _rollup_of(conn, stmt, chunk_rows: int) -> pd.DataFrame:
+    """Aggregate the quotes stmt selects (the _COLUMNS), chunk by chunk."""
+    result = conn.execution_options(yield_per=chunk_rows).execute(stmt)
+    parts = [aggregate(pd.DataFrame.from_records(rows, columns=[c.key for c in _COLUMNS])) for rows in result.partitions()]
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return aggregate(pd.DataFrame(columns=[c.key for c in _COLUMNS]))
+    return pd.concat(parts).groupby(list(_KEY), sort=False).sum().reset_index()
+
+
+def _swap(conn, rollup: pd.DataFrame):
+    conn.execute(delete(_TABLE))
+    _upsert(conn, _records(rollup))
+
+
+def backfill(chunk_rows: int = BACKFILL_CHUNK_ROWS) -> int:
+    """
+    Rebuild the rollups from the quotes table; returns the quotes counted.
+
+    SQLite has a single writer, so quote ids commit in id order: the quotes are read
+    up to a high-water id without holding the write lock, and the swap (delete,
+    insert, plus any quotes saved meanwhile) is one short transaction.
+    Server databases give no such ordering (a quote holding a lower id can commit
+    after the read), so there the read and the swap are one transaction that keeps
+    new quotes out until it commits: LOCK TABLE ... SHARE MODE on Postgres,
+    SERIALIZABLE elsewhere. Quote saves wait for the backfill meanwhile.
+    """
+    dialect = engine.dialect.name
+    if dialect != "sqlite":
+        isolation = "READ COMMITTED" if dialect == "postgresql" else "SERIALIZABLE"
+        with engine.connect().execution_options(isolation_level=isolation) as conn, conn.begin():
+            if dialect == "postgresql":
+                # Waits for in-flight quote inserts, then blocks new ones; reads still go through
+                conn.execute(text(f"LOCK TABLE {Quote.__tablename__} IN SHARE MODE"))
+            rollup = _rollup_of(conn, select(*_COLUMNS), chunk_rows)
+            _swap(conn, rollup)
+        return int(rollup["quote_count"].sum())
+
+    with engine.connect() as conn:
+        high_water = conn.execute(select(func.max(Quote.id))).scalar() or 0
+        rollup = _rollup_of(conn, select(*_COLUMNS).where(Quote.id <= high_water), chunk_rows)
+
+    with engine.begin() as conn:
+        _swap(conn, rollup)
+        # Saved while we were reading: their live rollup updates went to the rows just deleted
+        late = pd.read_sql(select(*_COLUMNS).where(Quote.id > high_water), conn)
+        _upsert(conn, _records(aggregate(late)))
+    return int(rollup["quote_count"].sum()) + len(late)
+
+
+def _since(days: int) -> date:
+    return datetime.utcnow().date() - timedelta(days=days - 1)
+
+
+def daily_summary(days: int = 30) -> pd.DataFrame:
+    """day x quote_type: quotes, revenue, weight for the last `days` UTC days."""
+    stmt = (
+        select(
+            _TABLE.c.day,
+            _TABLE.c.quote_type,
+            func.sum(_TABLE.c.quote_count).label("quotes"),
+            func.sum(_TABLE.c.total_sum).label("revenue"),
+            func.sum(_TABLE.c.weight_sum).label("weight"),
+        )
+        .where(_TABLE.c.day >= _since(days))
+        .group_by(_TABLE.c.day, _TABLE.c.quote_type)
+        .order_by(_TABLE.c.day)
+    )
+    with engine.connect() as conn:
+        return pd.read_sql(stmt, conn)
+
+
+def top_lanes(days: int = 30, limit: int = 20) -> pd.DataFrame:
+    """Busiest ZIP3 -> ZIP3 lanes per quote type by revenue over the last `days` UTC days."""
+    revenue = func.sum(_TABLE.c.total_sum)
+    stmt = (
+        select(
+            _TABLE.c.origin_zip3,
+            _TABLE.c.dest_zip3,
+            _TABLE.c.quote_type,
+            func.sum(_TABLE.c.quote_count).label("quotes"),
+            revenue.label("revenue"),
+            func.sum(_TABLE.c.weight_sum).label("weight"),
+        )
+        .where(_TABLE.c.day >= _since(days))
+        .group_by(_TABLE.c.origin_zip3, _TABLE.c.dest_zip3, _TABLE.c.quote_type)
+        .order_by(revenue.desc())
+        .limit(limit)
+    )
+    with engine.connect() as conn:
+        return pd.read_sql(stmt, conn)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        print(__doc__)
+        sys.exit(2)
+    print(f"{backfill():,} quotes rolled up")
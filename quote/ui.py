@@ -2,46 +2,31 @@
 # File: ui.py
 
 import streamlit as st
-import pandas as pd
 from quote.theme import inject_fsi_theme
-from quote.utils import normalize_workbook
-from quote.logic_hotshot import calculate_hotshot_quote
+from quote.rate_card import get_rate_card
+from quote.logic_hotshot import calculate_hotshot_quote, certain_zone, estimate_hotshot_quote
+from quote.distance import DistanceUnavailableError, cancel_prefetch, prefetch_distance
 from quote.logic_air import calculate_air_quote
-from db import Session, Quote  # NEW: persist quotes so email page can load by quote_id
+from quote.write_behind import save_quote  # persist quotes so email page can load by quote_id
 import uuid
 
 BOOK_URL = "https://freightservices.ts2000.net/login?returnUrl=%2FLogin%2F"
 
 
-def _first_numeric_in_column(series: pd.Series) -> float:
-    """Return the first numeric value in a column; handle $, commas, %, and skip instructions."""
-    for val in series.tolist():
-        s = str(val).strip()
-        if not s:
-            continue
-        # Skip instructional text like "multiply total by 1.25"
-        if "multiply" in s.lower():
-            continue
-        s = s.replace("$", "").replace(",", "")
-        if s.endswith("%"):
-            # Subtotal only includes fixed-$ accessorials; percentage handled separately (e.g., Guarantee)
-            continue
-        try:
-            return float(s)
-        except Exception:
-            continue
-    return 0.0
-
-
-def _headers_as_accessorials(df: pd.DataFrame) -> list[str]:
-    """Use table headers as accessorial labels; skip blank/unnamed columns."""
-    headers = []
-    for c in df.columns:
-        label = str(c).strip()
-        if not label or label.lower().startswith("unnamed"):
-            continue
-        headers.append(label)
-    return headers
+def _prefetch_lane(origin: str, destination: str, rates):
+    """Start the Hotshot distance lookup while the rest of the form is filled in; cancel it if a ZIP changes."""
+    lane = (origin.strip(), destination.strip())
+    current = st.session_state.get("distance_prefetch")
+    if current and current[0] == lane:
+        return
+    if current:
+        cancel_prefetch(current[1])
+    # Lanes whose band is certain from centroids are priced without any lookup
+    future = None if certain_zone(*lane, rates) else prefetch_distance(*lane)
+    if future is None:
+        st.session_state.pop("distance_prefetch", None)
+    else:
+        st.session_state.distance_prefetch = (lane, future)
 
 
 def quote_ui():
@@ -59,9 +44,8 @@ def quote_ui():
         st.rerun()
 
     quote_mode = st.radio("Select Quote Type", ["Hotshot", "Air"])
-    workbook = pd.read_excel("HotShot Quote.xlsx", sheet_name=None)
-    workbook = normalize_workbook(workbook)
-    accessorials_df = workbook["Accessorials"]  # headers are the accessorial names
+    workbook = get_rate_card()  # shared, read-only; one version for this whole rerun
+    accessorials = workbook.accessorials  # compiled once per version; headers are the accessorial names
 
     # ---------- Last Quote panel ----------
     if "quote_details" in st.session_state:
@@ -75,33 +59,47 @@ def quote_ui():
         </div>
         """
         st.markdown(big_text, unsafe_allow_html=True)
+        if details.get("metadata", {}).get("distance_source") == "bounds":
+            lower, upper = details["metadata"]["miles_bounds"]
+            st.caption(
+                f"Zone {details['metadata']['zone']} was set from ZIP-centroid mileage bounds "
+                f"({lower:,.0f}–{upper:,.0f} mi) without a driving-distance lookup."
+            )
 
-        # Open email form in a NEW TAB and pass quote_id for the new tab to load from DB/session
-        email_url = f"?page=email_request&quote_id={st.session_state.get('quote_id', '')}"
-        st.markdown(
-            f"""
-            <a href="{email_url}" target="_blank" rel="noopener noreferrer">
-                <button style="margin-top:8px;padding:10px 20px;font-size:16px;
-                                background-color:#005B99;color:white;border:none;border-radius:5px;">
-                    Email Quote Request ($15 admin fee)
-                </button>
-            </a>
-            """,
-            unsafe_allow_html=True,
-        )
+        if details.get("provisional"):
+            st.warning(
+                "⚠️ **Provisional estimate.** This price uses an estimated distance "
+                f"({details['metadata']['miles']:,.0f} mi) because the exact driving distance "
+                f"was unavailable: {details.get('provisional_reason', '')} "
+                "Generate the quote again to confirm it before emailing or booking."
+            )
+        else:
+            # Open email form in a NEW TAB and pass quote_id for the new tab to load from DB/session
+            email_url = f"?page=email_request&quote_id={st.session_state.get('quote_id', '')}"
+            st.markdown(
+                f"""
+                <a href="{email_url}" target="_blank" rel="noopener noreferrer">
+                    <button style="margin-top:8px;padding:10px 20px;font-size:16px;
+                                    background-color:#005B99;color:white;border:none;border-radius:5px;">
+                        Email Quote Request ($15 admin fee)
+                    </button>
+                </a>
+                """,
+                unsafe_allow_html=True,
+            )
 
-        # Book Quote (new tab)
-        st.markdown(
-            f"""
-            <a href="{BOOK_URL}" target="_blank" rel="noopener noreferrer">
-                <button style="margin-top:8px;padding:10px 20px;font-size:16px;
-                                background-color:#005B99;color:white;border:none;border-radius:5px;">
-                    Book Quote
-                </button>
-            </a>
-            """,
-            unsafe_allow_html=True,
-        )
+            # Book Quote (new tab)
+            st.markdown(
+                f"""
+                <a href="{BOOK_URL}" target="_blank" rel="noopener noreferrer">
+                    <button style="margin-top:8px;padding:10px 20px;font-size:16px;
+                                    background-color:#005B99;color:white;border:none;border-radius:5px;">
+                        Book Quote
+                    </button>
+                </a>
+                """,
+                unsafe_allow_html=True,
+            )
 
     # ---------- Create New Quote ----------
     st.subheader("Create New Quote")
@@ -111,6 +109,8 @@ def quote_ui():
     with col1:
         origin = st.text_input("Origin Zip")
         destination = st.text_input("Destination Zip")
+        if quote_mode == "Hotshot":
+            _prefetch_lane(origin, destination, workbook.hotshot_rates)
 
         st.subheader("📦 Weight Entry")
         actual_weight = st.number_input("Enter actual weight (lbs)", min_value=1.0, step=1.0)
@@ -132,7 +132,7 @@ def quote_ui():
         st.subheader("⚙️ Accessorials")
         selected: list[str] = []
 
-        accessorial_options = _headers_as_accessorials(accessorials_df)
+        accessorial_options = list(accessorials.names)
         if quote_mode == "Hotshot":
             accessorial_options = [a for a in accessorial_options if "guarantee" not in a.lower()]
 
@@ -140,13 +140,12 @@ def quote_ui():
             if st.checkbox(acc, key=f"acc_{i}"):
                 selected.append(acc)
 
-        # Subtotal: sum first numeric cell under each selected header (skip percentage-type like Guarantee here)
+        # Subtotal: flat price of each selected header (skip percentage-type like Guarantee here)
         subtotal = 0.0
         for acc in selected:
             if "guarantee" in acc.lower():
                 continue
-            if acc in accessorials_df.columns:
-                subtotal += _first_numeric_in_column(accessorials_df[acc])
+            subtotal += accessorials.fixed_price(acc)
 
         st.write(f"Accessorial Subtotal: ${subtotal:,.2f}")
 
@@ -161,12 +160,30 @@ def quote_ui():
             result = calculate_air_quote(origin, destination, weight, accessorial_total, workbook)
             quote_total = result["quote_total"]
             if guarantee_selected:
-                # Apply Guarantee last (25% multiplier)
-                quote_total *= 1.25
+                # Apply Guarantee last, at the multiplier compiled from the workbook
+                quote_total *= accessorials.multiplier(selected)
         else:
-            result = calculate_hotshot_quote(
-                origin, destination, weight, accessorial_total, workbook["Hotshot Rates"]
-            )
+            # Show an instant centroid-based estimate while the exact distance is looked up
+            estimate_box = st.empty()
+            estimate = estimate_hotshot_quote(origin, destination, weight, accessorial_total, workbook.hotshot_rates)
+            if estimate is not None:
+                estimate_box.info(
+                    f"⏱️ Estimated quote: ${estimate['quote_total']:,.2f} "
+                    f"(~{estimate['miles']:,.0f} mi) — confirming the exact driving distance…"
+                )
+            try:
+                result = calculate_hotshot_quote(
+                    origin, destination, weight, accessorial_total, workbook.hotshot_rates
+                )
+            except DistanceUnavailableError as e:
+                # The maps service is down/slow: keep the estimate, clearly flagged, but never
+                # for bad ZIPs or lanes Google says have no route
+                if estimate is None or e.result.status in ("bad_zip", "no_route"):
+                    estimate_box.empty()
+                    st.error(str(e))
+                    st.stop()
+                result = dict(estimate, provisional_reason=str(e))
+            estimate_box.empty()
             quote_total = result["quote_total"]
         # --- Add threshold warning ---
         weight_threshold = 1200 if quote_mode == "Air" else 5000
@@ -175,9 +192,27 @@ def quote_ui():
                                Phone: 800-651-0423  
                                Email: Operations@freightservices.net""")
             
+        details = {
+            "origin": origin,
+            "destination": destination,
+            "weight": weight,
+            "quote_type": quote_mode,
+            "accessorials": selected,
+            "guarantee_selected": guarantee_selected,
+            "quote_total": quote_total,   # base total for display; email page adds $15
+            "metadata": result,
+            "provisional": bool(result.get("provisional")),
+        }
+        if details["provisional"]:
+            # Estimates aren't saved: they can't be emailed or booked until the exact distance confirms them
+            details["provisional_reason"] = result.get("provisional_reason", "")
+            st.session_state.pop("quote_id", None)
+            st.session_state.quote_details = details
+            st.rerun()
+
         # Persist to DB so the email page (new tab) can load via ?quote_id=...
-        db = Session()
-        q = Quote(
+        # Queued for the background writer; the quote_id is ready immediately
+        saved_quote_id = save_quote(
             user_id=st.session_state.get("user"),
             user_email=st.session_state.get("email", ""),
             quote_type=quote_mode,
@@ -195,24 +230,10 @@ def quote_ui():
             actual_weight=float(actual_weight),
             dim_weight=float(dim_weight),
         )
-        db.add(q)
-        db.commit()
-        # SQLAlchemy populates q.quote_id (UUID default on model)
-        saved_quote_id = q.quote_id
-        db.close()
 
         # Persist “last quote” in session (BASE total — no admin fee here)
         st.session_state.quote_id = saved_quote_id
-        st.session_state.quote_details = {
-            "origin": origin,
-            "destination": destination,
-            "weight": weight,
-            "quote_type": quote_mode,
-            "accessorials": selected,
-            "guarantee_selected": guarantee_selected,
-            "quote_total": quote_total,   # base total for display; email page adds $15
-            "metadata": result,
-        }
+        st.session_state.quote_details = details
 
         # Immediate Book button (also appears in Last Quote on re-render)
         st.markdown(
@@ -1,5 +1,7 @@
 import pandas as pd
 import re
+from bisect import bisect_left
+from types import MappingProxyType
 
 def normalize_workbook(workbook):
     for sheet_name, df in workbook.items():
@@ -7,6 +9,46 @@ def normalize_workbook(workbook):
         workbook[sheet_name] = df
     return workbook
 
+class ReadOnly:
+    """Base for compiled rate structures: attributes are set once in __init__ and never change."""
+    __slots__ = ()
+
+    def _init(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+
+def find_columns(df: pd.DataFrame, wanted: dict, sheet: str) -> dict:
+    """
+    Resolve {key: substring} to actual headers (first header containing the substring,
+    case-insensitive). Raises KeyError listing every header that is missing.
+    """
+    found = {key: next((col for col in df.columns if needle in str(col).upper()), None) for key, needle in wanted.items()}
+    missing = [key for key, col in found.items() if col is None]
+    if missing:
+        raise KeyError(
+            f"Could not find a column containing {', '.join(repr(k) for k in missing)} in the {sheet} sheet. "
+            "Please check your sheet headers."
+        )
+    return found
+
+
+def parse_money(x) -> float:
+    """'$1,234.50', ' 1234.5 ', 1234.5 -> 1234.5. Blank/NaN -> NaN; other text raises ValueError."""
+    if x is None or (isinstance(x, float) and x != x):
+        return float("nan")
+    s = str(x).strip().replace("$", "").replace(",", "")
+    if not s:
+        return float("nan")
+    return float(s)
+
+
 def _pick_name_column(df: pd.DataFrame) -> str:
     preferred = {"ACCESSORIAL", "ACCESSORIALS", "NAME", "DESCRIPTION", "LABEL", "SERVICE", "OPTION"}
     for c in df.columns:
@@ -39,67 +81,168 @@ def _to_number(x) -> float:
     except Exception:
         return float("nan")
 
-def calculate_accessorials(accessorials_df, selected, quote_mode, actual_weight):
-    df = accessorials_df.copy()
-    df.columns = [str(c).strip() for c in df.columns]
+def _first_numeric(values) -> float | None:
+    """First numeric cell in a header-layout column; skips $/commas, %-values and instructions like 'multiply total by 1.25'."""
+    for val in values:
+        s = str(val).strip()
+        if not s:
+            continue
+        if "multiply" in s.lower():
+            continue
+        s = s.replace("$", "").replace(",", "")
+        if s.endswith("%"):
+            continue
+        try:
+            return float(s)
+        except Exception:
+            continue
+    return None
 
-    name_col   = _pick_name_column(df)
-    type_col   = _find_col(df, "TYPE")
-    rate_col   = _find_col(df, "RATE", "COST", "PRICE")
-    weight_col = _find_col(df, "WEIGHT", "WT")
 
-    total = 0.0
-    names = df[name_col].astype(str).str.strip()
+class Accessorial(ReadOnly):
+    """
+    One compiled accessorial. kind is FIXED (rate in $), PERCENTAGE (rate as a fraction),
+    WEIGHT BREAK (weights/rates tiers, ascending) or MULTIPLIER (e.g. Guarantee: total x rate).
+    """
+    __slots__ = ("name", "kind", "rate", "weights", "rates")
 
-    for acc in selected:
-        mask = names.eq(str(acc).strip())
-        if not mask.any():
-            continue
-        rows = df.loc[mask].copy()
+    def __init__(self, name: str, kind: str, rate: float = float("nan"), weights=(), rates=()):
+        self._init(name=name, kind=kind, rate=rate, weights=tuple(weights), rates=tuple(rates))
 
-        # Determine rate type (fallback by inspecting the rate value)
-        if type_col is not None:
-            rate_type = str(rows.iloc[0][type_col]).strip().upper()
+    def charge(self, weight: float) -> float:
+        """Dollar amount for a shipment of this weight (MULTIPLIER applies to the total, so 0 here)."""
+        if self.kind == "FIXED":
+            val = self.rate
+        elif self.kind == "PERCENTAGE":
+            val = self.rate * float(weight or 0.0)
+        elif self.kind == "WEIGHT BREAK":
+            if not self.weights:
+                return 0.0
+            # First tier at or above the weight; heavier shipments use the last tier
+            i = min(bisect_left(self.weights, float(weight or 0.0)), len(self.weights) - 1)
+            val = self.rates[i]
         else:
-            rate_type = ""
-
-        if not rate_type:
-            raw = str(rows.iloc[0][rate_col]) if rate_col is not None else ""
-            rate_type = "PERCENTAGE" if raw.strip().endswith("%") else "FIXED"
-
-        if rate_type in ("FIXED", "FLAT"):
-            if rate_col is not None:
-                val = _to_number(rows.iloc[0][rate_col])
-                if pd.notna(val):
-                    total += val
-
-        elif rate_type == "PERCENTAGE":
-            if rate_col is not None:
-                val = _to_number(rows.iloc[0][rate_col])
-                if val > 1.0:
-                    val /= 100.0
-                if pd.notna(val):
-                    total += val * float(actual_weight or 0.0)
-
-        elif rate_type == "WEIGHT BREAK":
-            if rate_col is None:
+            return 0.0
+        return 0.0 if pd.isna(val) else val
+
+
+class AccessorialTable(ReadOnly):
+    """
+    The Accessorials sheet compiled once per rate-card version: the option names in sheet
+    order and name -> Accessorial. Two layouts are understood:
+      * headers as names (the current workbook): one column per accessorial, its first
+        numeric cell is the flat price; "multiply ..." / "%" cells make it a multiplier/percentage
+      * one row per accessorial (or per weight tier) with name/type/rate[/weight] columns
+    """
+    __slots__ = ("names", "entries")
+
+    def __init__(self, names, entries: dict):
+        self._init(names=tuple(names), entries=MappingProxyType(dict(entries)))
+
+    @classmethod
+    def from_sheet(cls, df: pd.DataFrame) -> "AccessorialTable":
+        df = df.copy()
+        df.columns = [str(c).strip() for c in df.columns]
+        preferred = {"ACCESSORIAL", "ACCESSORIALS", "NAME", "DESCRIPTION", "LABEL", "SERVICE", "OPTION"}
+        has_name_col = any(c.upper() in preferred for c in df.columns)
+        if has_name_col and _find_col(df, "RATE", "COST", "PRICE") is not None:
+            return cls._from_rows(df)
+        return cls._from_headers(df)
+
+    @classmethod
+    def _from_headers(cls, df: pd.DataFrame) -> "AccessorialTable":
+        names, entries = [], {}
+        for c in df.columns:
+            label = str(c).strip()
+            if not label or label.lower().startswith("unnamed") or label in entries:
                 continue
-            if weight_col is None:
-                val = _to_number(rows.iloc[0][rate_col])
-                if pd.notna(val):
-                    total += val
+            values = df[c].tolist()
+            price = _first_numeric(values)
+            texts = [str(v).strip() for v in values if pd.notna(v)]
+            multiply = next((t for t in texts if "multiply" in t.lower()), None)
+            percent = next((t for t in texts if t.endswith("%")), None)
+            if price is not None:
+                acc = Accessorial(label, "FIXED", price)
+            elif multiply is not None:
+                factor = re.findall(r"\d+(?:\.\d+)?", multiply)
+                acc = Accessorial(label, "MULTIPLIER", float(factor[-1]) if factor else float("nan"))
+            elif percent is not None:
+                acc = Accessorial(label, "PERCENTAGE", _to_number(percent) / 100.0)
+            else:
+                acc = Accessorial(label, "FIXED", 0.0)
+            names.append(label)
+            entries[label] = acc
+        return cls(names, entries)
+
+    @classmethod
+    def _from_rows(cls, df: pd.DataFrame) -> "AccessorialTable":
+        name_col   = _pick_name_column(df)
+        type_col   = _find_col(df, "TYPE")
+        rate_col   = _find_col(df, "RATE", "COST", "PRICE")
+        weight_col = _find_col(df, "WEIGHT", "WT")
+
+        names, entries = [], {}
+        labels = df[name_col].astype(str).str.strip()
+        for label in labels.unique():
+            rows = df.loc[labels.eq(label)]
+            first = rows.iloc[0]
+
+            # Determine rate type (fallback by inspecting the rate value)
+            rate_type = str(first[type_col]).strip().upper() if type_col is not None and pd.notna(first[type_col]) else ""
+            if not rate_type:
+                rate_type = "PERCENTAGE" if str(first[rate_col]).strip().endswith("%") else "FIXED"
+
+            rate = _to_number(first[rate_col])
+            if rate_type in ("FIXED", "FLAT"):
+                acc = Accessorial(label, "FIXED", rate)
+            elif rate_type == "PERCENTAGE":
+                acc = Accessorial(label, "PERCENTAGE", rate / 100.0 if rate > 1.0 else rate)
+            elif rate_type == "WEIGHT BREAK" and weight_col is None:
+                acc = Accessorial(label, "FIXED", rate)
+            elif rate_type == "WEIGHT BREAK":
+                tiers = pd.DataFrame({
+                    "w": pd.to_numeric(rows[weight_col], errors="coerce"),
+                    "r": rows[rate_col].map(_to_number),
+                }).dropna(subset=["w"]).sort_values("w", kind="stable")
+                acc = Accessorial(label, "WEIGHT BREAK", weights=tiers["w"].tolist(), rates=tiers["r"].tolist())
             else:
-                tmp = rows.copy()
-                tmp[weight_col] = pd.to_numeric(tmp[weight_col], errors="coerce")
-                tmp = tmp.dropna(subset=[weight_col]).sort_values(weight_col)
-                if tmp.empty:
-                    continue
-                w = float(actual_weight or 0.0)
-                match = tmp[tmp[weight_col] >= w].head(1)
-                if match.empty:
-                    match = tmp.tail(1)
-                val = _to_number(match.iloc[0][rate_col])
-                if pd.notna(val):
-                    total += val
-
-    return total
+                continue  # unknown type: contributes nothing
+            names.append(label)
+            entries[label] = acc
+        return cls(names, entries)
+
+    def get(self, name) -> Accessorial | None:
+        return self.entries.get(str(name).strip())
+
+    def fixed_price(self, name) -> float:
+        """Flat $ price of an accessorial (0.0 for unknown names and non-flat kinds)."""
+        acc = self.get(name)
+        if acc is None or acc.kind != "FIXED" or pd.isna(acc.rate):
+            return 0.0
+        return acc.rate
+
+    def multiplier(self, selected) -> float:
+        """Factor the quote total is multiplied by for the selected MULTIPLIER accessorials (1.0 if none)."""
+        factor = 1.0
+        for name in selected:
+            acc = self.get(name)
+            if acc is not None and acc.kind == "MULTIPLIER" and not pd.isna(acc.rate):
+                factor *= acc.rate
+        return factor
+
+    def total(self, selected, actual_weight) -> float:
+        total = 0.0
+        for name in selected:
+            acc = self.get(name)
+            if acc is not None:
+                total += acc.charge(actual_weight)
+        return total
+
+
+def calculate_accessorials(accessorials_df, selected, quote_mode, actual_weight):
+    """Sum of the selected accessorials; pass a RateCard's compiled .accessorials to skip re-parsing the sheet."""
+    if isinstance(accessorials_df, AccessorialTable):
+        table = accessorials_df
+    else:
+        table = AccessorialTable.from_sheet(accessorials_df)
+    return table.total(selected, actual_weight)
@@ -0,0 +1,282 @@
+# File: write_behind.py
+"""
+Write-behind persistence for quotes and email quote requests.
+
+Generating a quote used to wait on a synchronous INSERT + COMMIT: an fsync,
+plus the write lock every other session was also waiting for. Inserts are now
+handed to one background writer thread through a bounded queue and committed
+in groups (up to WRITE_BEHIND_BATCH rows per transaction), so the page returns
+as soon as the row is queued. The quote_id (and created_at) is generated up
+front, so callers get it immediately.
+
+Read-your-writes: rows stay in a pending map until their transaction commits,
+and find_quote() checks it before the database. The email page opened in a new
+tab (a new session in the same server process) finds a just-generated quote
+even if it hasn't been flushed yet. Replicas in other processes only see it
+once it's committed, a few milliseconds later.
+
+The queue is flushed at interpreter exit. If it's full for longer than
+WRITE_BEHIND_PUT_TIMEOUT seconds, the row is written synchronously instead,
+so backpressure slows callers down but never drops a write. The exception is
+an email request whose quote is still queued: it waits for queue space instead,
+since a synchronous insert would reach the database before its parent quote.
+WRITE_BEHIND=0 turns the whole thing off (every save is synchronous).
+
+Transient database errors (a locked SQLite file, a dropped server connection,
+pool timeouts) are retried with backoff: the writer thread keeps retrying until
+the database is back, a synchronous write for up to WRITE_BEHIND_RETRY_SECONDS
+before the error reaches the caller. Only a permanent error (a constraint
+violation, bad data) drops a row, and that is logged as an error. The daily
+rollup update runs in a savepoint, so a rollup failure never costs the quote.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy.exc import DBAPIError, OperationalError, SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from db import EmailQuoteRequest, Quote, Session
+from quote.rollups import add_quotes
+
+ENABLED = os.getenv("WRITE_BEHIND", "1") != "0"
+QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "1000"))
+BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH", "100"))
+# How long the writer waits for more rows to share a transaction with the first one
+LINGER_SECONDS = float(os.getenv("WRITE_BEHIND_LINGER_SECONDS", "0.02"))
+PUT_TIMEOUT_SECONDS = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT", "1"))
+# Transient errors: backoff between attempts, and how long a synchronous write keeps trying
+RETRY_BACKOFF_SECONDS = 0.1
+RETRY_BACKOFF_MAX_SECONDS = 10.0
+RETRY_SECONDS = float(os.getenv("WRITE_BEHIND_RETRY_SECONDS", "10"))
+
+log = logging.getLogger(__name__)
+
+# Parents first, so a batch never inserts an email request before its quote
+_INSERT_ORDER = (Quote, EmailQuoteRequest)
+
+
+class WriteBehindQueue:
+    """Bounded queue + one daemon writer thread that commits queued inserts in batches."""
+
+    def __init__(self, session_factory=Session, maxsize: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE, linger: float = LINGER_SECONDS):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.linger = linger
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._pending: dict[str, dict] = {}  # quote_id -> Quote column values, until committed
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.counts = {"queued": 0, "written": 0, "batches": 0, "failed": 0, "retried": 0, "synchronous": 0}
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def submit(self, model, values: dict):
+        """Queue one insert of model(**values); falls back to a synchronous write when the queue stays full."""
+        if model is Quote:
+            with self._lock:
+                self._pending[values["quote_id"]] = values
+        self._start()
+        try:
+            self._queue.put((model, values), timeout=PUT_TIMEOUT_SECONDS)
+        except queue.Full:
+            if model is EmailQuoteRequest and self.pending_quote(values["quote_id"]) is not None:
+                # The queue is FIFO, so behind its quote is the only safe place for it
+                self._queue.put((model, values))
+            else:
+                with self._lock:
+                    self.counts["synchronous"] += 1
+                # The caller is waiting: give up (and raise) after RETRY_SECONDS rather than hang
+                self._write([(model, values)], give_up_after=RETRY_SECONDS)
+                return
+        with self._lock:
+            self.counts["queued"] += 1
+
+    def pending_quote(self, quote_id: str) -> dict | None:
+        with self._lock:
+            return self._pending.get(quote_id)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            give_up_at = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, give_up_at - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: list, give_up_after: float | None = None):
+        """
+        One transaction for the whole batch, retried while the error is transient. On a
+        permanent error, retry row by row so one bad row can't sink the rest; only rows
+        that fail permanently on their own are dropped. With give_up_after set, a
+        transient error that outlasts it is raised instead.
+        """
+        batch = sorted(batch, key=lambda item: _INSERT_ORDER.index(item[0]))
+        try:
+            if self._commit_retrying(batch, give_up_after) is not None and len(batch) > 1:
+                for item in batch:
+                    self._commit_retrying([item], give_up_after)
+        finally:
+            with self._lock:
+                self.counts["batches"] += 1
+                for model, values in batch:
+                    if model is Quote:
+                        self._pending.pop(values["quote_id"], None)
+
+    def _commit_retrying(self, items: list, give_up_after: float | None) -> Exception | None:
+        """Commit items; None when written, else the permanent error (already logged as a drop)."""
+        give_up_at = None if give_up_after is None else time.monotonic() + give_up_after
+        attempt = 0
+        while True:
+            error = self._commit(items)
+            if error is None:
+                return None
+            if not _is_transient(error):
+                if len(items) == 1:
+                    model, values = items[0]
+                    log.error("write-behind dropped %s %r: %s", model.__name__, values.get("quote_id"), error)
+                    with self._lock:
+                        self.counts["failed"] += 1
+                return error
+            pause = min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** attempt)
+            if give_up_at is not None and time.monotonic() + pause > give_up_at:
+                raise error
+            log.warning("write-behind retrying %d row(s) in %.1fs after a transient error: %s", len(items), pause, error)
+            with self._lock:
+                self.counts["retried"] += 1
+            time.sleep(pause)
+            attempt += 1
+
+    def _commit(self, items: list) -> Exception | None:
+        """One attempt at one transaction; returns the error instead of raising it."""
+        db = self.session_factory()
+        try:
+            _insert(db, items)
+            db.commit()
+            with self._lock:
+                self.counts["written"] += len(items)
+            return None
+        except Exception as e:  # non-database errors (bad values) count as permanent
+            db.rollback()
+            return e
+        finally:
+            db.close()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until everything queued so far is committed (or timeout); True if drained."""
+        if timeout is None:
+            self._queue.join()
+            return True
+        give_up_at = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= give_up_at:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts, backlog=self._queue.qsize(), pending_quotes=len(self._pending))
+
+
+def _is_transient(error: Exception) -> bool:
+    """Errors worth retrying: locks, lost connections, pool timeouts; not constraint violations or bad data."""
+    if isinstance(error, PoolTimeoutError):
+        return True
+    if isinstance(error, OperationalError):
+        # SQLite reports schema problems ("no such table") as OperationalError too; only lock waits pass
+        if type(error.orig).__module__ == "sqlite3":
+            return any(word in str(error.orig).lower() for word in ("locked", "busy"))
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+def _insert(db, items: list):
+    """
+    Add (model, values) rows to the session, and the quotes among them to the daily
+    rollups in the same transaction. The rollup update runs in a savepoint: if it fails
+    for a reason other than a transient error, only it is rolled back (a backfill
+    catches up) and the rows are still committed.
+    """
+    db.add_all([model(**values) for model, values in items])
+    db.flush()  # the rows' own errors surface here, outside the savepoint
+    quotes = [values for model, values in items if model is Quote]
+    if not quotes:
+        return
+    try:
+        with db.begin_nested():
+            add_quotes(db, quotes)
+    except SQLAlchemyError as e:
+        if _is_transient(e):
+            raise
+        log.error("write-behind: rollup update failed for %d quote(s), run python -m quote.rollups backfill: %s", len(quotes), e)
+
+
+_writer: WriteBehindQueue | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> WriteBehindQueue:
+    """The process-wide queue (every Streamlit session thread shares one writer)."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehindQueue()
+                atexit.register(_writer.flush, 30)
+    return _writer
+
+
+def _save(model, values: dict):
+    values.setdefault("created_at", datetime.utcnow())  # quote time, not flush time
+    if ENABLED:
+        get_writer().submit(model, values)
+        return
+    db = Session()
+    try:
+        _insert(db, [(model, values)])
+        db.commit()
+    finally:
+        db.close()
+
+
+def save_quote(**values) -> str:
+    """Persist a Quote (columns as keyword arguments) and return its quote_id right away."""
+    values.setdefault("quote_id", str(uuid.uuid4()))
+    _save(Quote, values)
+    return values["quote_id"]
+
+
+def save_email_request(**values):
+    """Persist an EmailQuoteRequest (columns as keyword arguments)."""
+    _save(EmailQuoteRequest, values)
+
+
+def find_quote(quote_id: str) -> Quote | None:
+    """The quote with this quote_id, including one still waiting in the write-behind queue."""
+    if not quote_id:
+        return None
+    pending = get_writer().pending_quote(quote_id) if ENABLED else None
+    if pending is not None:
+        return Quote(**pending)  # transient copy; never attached to a session
+    db = Session()
+    try:
+        return db.query(Quote).filter(Quote.quote_id == quote_id).first()
+    finally:
+        db.close()
@@ -0,0 +1,132 @@
+# File: zip3_matrix.py
+"""
+Offline ZIP3 -> ZIP3 mileage matrix.
+
+A 1000 x 1000 uint16 array of representative driving miles between 3-digit
+ZIP prefixes (2 MB), built from the exact lookups already in the distance
+cache. It is saved as a plain .npy file and opened with mmap_mode="r", so a
+lookup is one array read and every process (Streamlit, batch workers) shares
+the same pages through the OS cache instead of holding its own copy.
+
+quote.distance uses it when Google can't answer and for offline bulk
+re-pricing. Cells nobody has driven yet are UNKNOWN.
+
+    python -m quote.zip3_matrix [distance_cache.db] [zip3_miles.npy]   # (re)build
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    from quote.distance_cache import CACHE_PATH
+    from quote.utils import ReadOnly
+    from quote.zip_index import zip_key, zip_keys
+except ImportError:
+    from distance_cache import CACHE_PATH
+    from utils import ReadOnly
+    from zip_index import zip_key, zip_keys
+
+MATRIX_PATH = os.getenv("DISTANCE_ZIP3_MATRIX", "zip3_miles.npy")
+PREFIXES = 1000
+UNKNOWN = np.iinfo(np.uint16).max
+
+
+class Zip3Matrix(ReadOnly):
+    """Read-only view over the memory-mapped matrix; miles[o3, d3], UNKNOWN where no lane was seen."""
+
+    __slots__ = ("miles", "path")
+
+    def __init__(self, miles: np.ndarray, path: str = ""):
+        if miles.shape != (PREFIXES, PREFIXES) or miles.dtype != np.uint16:
+            raise ValueError(f"ZIP3 matrix must be {PREFIXES}x{PREFIXES} uint16, got {miles.shape} {miles.dtype}")
+        self._init(miles=miles, path=path)
+
+    @classmethod
+    def open(cls, path: str = MATRIX_PATH) -> "Zip3Matrix":
+        return cls(np.load(path, mmap_mode="r"), path)
+
+    def lookup(self, origin, destination) -> float | None:
+        o, d = zip_key(origin), zip_key(destination)
+        if o is None or d is None:
+            return None
+        miles = self.miles[o // 100, d // 100]
+        return None if miles == UNKNOWN else float(miles)
+
+    def lookup_many(self, origins, destinations) -> np.ndarray:
+        """Vectorized lookup: float miles per lane, NaN where unknown or not a ZIP."""
+        o, d = zip_keys(origins), zip_keys(destinations)
+        ok = (o >= 0) & (d >= 0)
+        miles = self.miles[np.where(ok, o, 0) // 100, np.where(ok, d, 0) // 100].astype(float)
+        miles[~ok | (miles == UNKNOWN)] = np.nan
+        return miles
+
+    @property
+    def coverage(self) -> int:
+        """Number of ZIP3 pairs with a value."""
+        return int((self.miles != UNKNOWN).sum())
+
+
+def build_matrix(cache_path: str = CACHE_PATH, out_path: str = MATRIX_PATH) -> int:
+    """
+    Rebuild the matrix from every lane in the distance cache: each ZIP3 pair gets the
+    median of its cached lanes' miles. Written to a temp file and swapped in with
+    os.replace, so readers never see a half-written matrix. Returns the filled pair count.
+    """
+    with sqlite3.connect(cache_path) as conn:
+        df = pd.read_sql_query("SELECT origin, destination, miles FROM distances", conn)
+    o, d = zip_keys(df["origin"]), zip_keys(df["destination"])
+    ok = (o >= 0) & (d >= 0)
+    lanes = pd.DataFrame({"o3": o[ok] // 100, "d3": d[ok] // 100, "miles": df["miles"].to_numpy(dtype=float)[ok]})
+    medians = lanes.groupby(["o3", "d3"])["miles"].median()
+
+    matrix = np.full((PREFIXES, PREFIXES), UNKNOWN, dtype=np.uint16)
+    o3 = medians.index.get_level_values("o3").to_numpy()
+    d3 = medians.index.get_level_values("d3").to_numpy()
+    matrix[o3, d3] = np.clip(np.rint(medians.to_numpy()), 0, UNKNOWN - 1).astype(np.uint16)
+
+    folder = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp = tempfile.mkstemp(prefix=".zip3-", suffix=".npy", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp, out_path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+    return len(medians)
+
+
+# path -> (Zip3Matrix, (mtime_ns, size)); reopened when a rebuild replaces the file
+_matrices: dict[str, tuple] = {}
+_matrices_lock = threading.Lock()
+
+
+def get_zip3_matrix(path: str = MATRIX_PATH) -> Zip3Matrix | None:
+    """The shared memory-mapped matrix, or None if it hasn't been built."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    entry = _matrices.get(path)
+    if entry is not None and entry[1] == stamp:
+        return entry[0]
+    with _matrices_lock:
+        try:
+            matrix = Zip3Matrix.open(path)
+        except (OSError, ValueError) as e:
+            print(f"[zip3] could not open {path}: {e}")
+            return entry[0] if entry else None
+        _matrices[path] = (matrix, stamp)
+        return matrix
+
+
+if __name__ == "__main__":
+    cache = sys.argv[1] if len(sys.argv) > 1 else CACHE_PATH
+    out = sys.argv[2] if len(sys.argv) > 2 else MATRIX_PATH
+    print(f"{build_matrix(cache, out):,} ZIP3 pairs -> {out}")
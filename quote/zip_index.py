@@ -0,0 +1,130 @@
+# File: zip_index.py
+"""
+Dense ZIP -> Air zone index.
+
+One slot per possible 5-digit ZIP (00000-99999), so a lookup is a single
+array read instead of a scan of the 28k-row "ZIP CODE ZONES" sheet. ZIPs are
+keyed by their integer value, which makes "02134", "2134" and the 2134 that
+Excel stores for it all land on the same slot.
+"""
+import numpy as np
+import pandas as pd
+try:
+    from quote.utils import ReadOnly, find_columns
+except ImportError:
+    from utils import ReadOnly, find_columns
+
+SLOTS = 100_000
+NO_BEYOND = ("", "N/A", "NO", "NONE", "NAN")
+
+
+def zip_key(value) -> int | None:
+    """Slot for a ZIP given as str/int/float ("02134", 2134, "02134-1234", "02134,USA"); None if not a ZIP."""
+    if isinstance(value, (bool, np.bool_)):
+        return None
+    if isinstance(value, (int, np.integer)):
+        n = int(value)
+    elif isinstance(value, (float, np.floating)):
+        if not np.isfinite(value) or value != int(value):
+            return None
+        n = int(value)
+    else:
+        digits = "".join(ch for ch in str(value).strip() if ch.isdigit())
+        if len(digits) == 9:  # ZIP+4
+            digits = digits[:5]
+        if not 1 <= len(digits) <= 5:
+            return None
+        n = int(digits)
+    return n if 0 <= n < SLOTS else None
+
+
+def zip_keys(values) -> np.ndarray:
+    """Vectorized zip_key: int64 slots, -1 where a value isn't a ZIP. Each distinct value is parsed once."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = np.full(len(uniques), -1, dtype=np.int64)
+    # Fast path for the common case of plain 5-digit strings
+    plain = uniques.map(type).eq(str).to_numpy() & uniques.astype(str).str.fullmatch(r"\d{5}").to_numpy()
+    parsed[plain] = uniques[plain].astype(np.int64).to_numpy()
+    for i in np.flatnonzero(~plain):
+        k = zip_key(uniques.iat[i])
+        parsed[i] = -1 if k is None else k
+    keys = np.full(len(codes), -1, dtype=np.int64)
+    hit = codes >= 0
+    keys[hit] = parsed[codes[hit]]
+    return keys
+
+
+def _beyond_code(value) -> str | None:
+    val = str(value).strip().upper()
+    if val in NO_BEYOND:
+        return None
+    return val.split()[-1]
+
+
+class ZipZoneIndex(ReadOnly):
+    """ZIP -> (DEST ZONE, beyond code). Zones are stored as int16 (-1 = unknown ZIP), beyond codes as uint16 ids."""
+
+    __slots__ = ("zones", "beyond", "beyond_codes")
+
+    SHEET = "ZIP CODE ZONES"
+    COLUMNS = {"ZIPCODE": "ZIPCODE", "DEST ZONE": "DEST ZONE", "BEYOND": "BEYOND"}
+
+    def __init__(self, zones: np.ndarray, beyond: np.ndarray, beyond_codes: tuple):
+        for arr in (zones, beyond):
+            arr.flags.writeable = False
+        # beyond_codes: id -> code; id 0 is "no beyond charge"
+        self._init(zones=zones, beyond=beyond, beyond_codes=tuple(beyond_codes))
+
+    @classmethod
+    def from_sheet(cls, zip_zone_df: pd.DataFrame, cols: dict | None = None) -> "ZipZoneIndex":
+        cols = cols or find_columns(zip_zone_df, cls.COLUMNS, cls.SHEET)
+
+        keys = zip_zone_df[cols["ZIPCODE"]].map(zip_key)
+        keep = keys.notna() & ~keys.duplicated(keep="first")  # first row wins, like the old row scan
+        keys = keys[keep].astype(np.int64).to_numpy()
+
+        zone_vals = pd.to_numeric(zip_zone_df.loc[keep, cols["DEST ZONE"]], errors="coerce")
+        zones = np.full(SLOTS, -1, dtype=np.int16)
+        valid = zone_vals.notna().to_numpy()
+        zones[keys[valid]] = zone_vals[valid].astype(np.int16).to_numpy()
+
+        codes = zip_zone_df.loc[keep, cols["BEYOND"]].map(_beyond_code)
+        beyond_codes = (None,) + tuple(sorted({c for c in codes if c is not None}))
+        ids = {code: i for i, code in enumerate(beyond_codes)}
+        beyond = np.zeros(SLOTS, dtype=np.uint16)
+        beyond[keys] = codes.map(ids).to_numpy(dtype=np.uint16)
+        return cls(zones, beyond, beyond_codes)
+
+    def zones_for(self, keys: np.ndarray) -> np.ndarray:
+        """Dest zone per slot from zip_keys(); -1 for invalid or unknown ZIPs."""
+        return np.where(keys >= 0, self.zones[np.maximum(keys, 0)], -1)
+
+    def _slot(self, zipcode) -> int:
+        slot = zip_key(zipcode)
+        if slot is None or self.zones[slot] < 0:
+            raise KeyError(f"ZIP code {zipcode!r} not found in ZIP CODE ZONES")
+        return slot
+
+    def dest_zone(self, zipcode) -> int:
+        return int(self.zones[self._slot(zipcode)])
+
+    def beyond_code(self, zipcode) -> str | None:
+        slot = zip_key(zipcode)
+        if slot is None:
+            return None
+        return self.beyond_codes[self.beyond[slot]]
+
+    def __contains__(self, zipcode) -> bool:
+        slot = zip_key(zipcode)
+        return slot is not None and self.zones[slot] >= 0
+
+    def __len__(self) -> int:
+        return int((self.zones >= 0).sum())
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.zones.nbytes + self.beyond.nbytes)
+
+    def __repr__(self):
+        return f"ZipZoneIndex({len(self)} ZIPs, {len(self.beyond_codes) - 1} beyond codes, {self.nbytes / 1024:.0f} KiB)"